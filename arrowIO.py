@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Optional Parquet and Arrow IPC (feather v2) tables, needs the pyarrow module.
+# Columns are addressed by 0-based number as in the tab delimited files and only the columns asked for are read,
+# so phenotype, GRS and kinship readers project a wide table onto the few columns they use. Values are given back
+# as numbers, or as the strings the same value has in a text file (null is NA, whole floats have no decimals).
+############################
+##### IMPORT MODULES #######
+###########################
+import numpy as np
+try:
+  import pyarrow as pa #optional, only needed for Parquet and Arrow files
+  import pyarrow.parquet as pq
+except ImportError:
+  pa=None
+
+############################
+######### FUNCTIONS ########
+############################
+
+FORMATS=("parquet","arrow") #formats found by compressedIO.headFormat from the magic bytes PAR1 and ARROW1
+EXTENSIONS={".parquet":"parquet",".pq":"parquet",".arrow":"arrow",".feather":"arrow",".ipc":"arrow"}
+
+def requireArrow():
+  if pa is None:
+    raise IOError("reading or writing Parquet and Arrow files needs the pyarrow module")
+
+#parquet, arrow or None from the output file name
+def outputFormat(filename):
+  for ext,fmt in EXTENSIONS.items():
+    if filename.endswith(ext):
+      return fmt
+  return None
+
+#schema of a Parquet or Arrow IPC file
+def readSchema(filename):
+  requireArrow()
+  with open(filename,"rb") as f:
+    parquet=f.read(4)=="PAR1"
+  if parquet:
+    return pq.read_schema(filename)
+  return pa.ipc.open_file(pa.memory_map(filename)).schema
+
+def columnNames(filename):
+  return [str(x) for x in readSchema(filename).names]
+
+#0-based numbers of the numeric columns
+def numericColumns(filename):
+  schema=readSchema(filename)
+  return [i for i in range(len(schema.names)) if pa.types.is_integer(schema.types[i]) or pa.types.is_floating(schema.types[i])]
+
+#record batches of the columns in cols (all columns if None), each as a list of arrays in the order of cols
+#Parquet is read one row group at a time and Arrow IPC files are memory mapped, so columns not asked for are not read
+def readBatches(filename,cols=None):
+  requireArrow()
+  names=columnNames(filename)
+  cols=range(len(names)) if cols is None else list(cols)
+  with open(filename,"rb") as f:
+    parquet=f.read(4)=="PAR1"
+  if parquet:
+    pf=pq.ParquetFile(filename)
+    for group in range(pf.num_row_groups):
+      table=pf.read_row_group(group,columns=sorted(set(names[c] for c in cols)))
+      for batch in table.to_batches():
+        byName=dict((str(batch.schema.names[k]),batch.column(k)) for k in range(batch.num_columns))
+        yield [byName[names[c]] for c in cols]
+  else:
+    reader=pa.ipc.open_file(pa.memory_map(filename))
+    for i in range(reader.num_record_batches):
+      batch=reader.get_batch(i)
+      yield [batch.column(c) for c in cols]
+
+#text value of every element of an array, as it would be written in a tab delimited file
+def strings(arr):
+  values=arr.to_pylist()
+  if pa.types.is_floating(arr.type):
+    return ["NA" if x is None or x!=x else ("%d" % x if x==int(x) else repr(x)) for x in values]
+  if pa.types.is_boolean(arr.type):
+    return ["NA" if x is None else ("1" if x else "0") for x in values]
+  if pa.types.is_string(arr.type):
+    return ["NA" if x is None else x.encode("utf-8") for x in values]
+  return ["NA" if x is None else str(x) for x in values]
+
+#float64 values of an array, null and text that is not a number are NaN
+def floats(arr):
+  if pa.types.is_integer(arr.type) or pa.types.is_floating(arr.type):
+    return np.asarray(arr.to_numpy(zero_copy_only=False),dtype=np.float64)
+  values=np.full(len(arr),np.nan)
+  for i,x in enumerate(strings(arr)):
+    try:
+      values[i]=float(x)
+    except ValueError:
+      pass
+  return values
+
+#elements rows of an array as text values
+def take(arr,rows):
+  return strings(arr.take(pa.array(np.asarray(rows,dtype=np.int64))))
+
+#text values of the columns in cols (all columns if None), one list per column
+def readColumns(filename,cols=None):
+  columns=None
+  for batch in readBatches(filename,cols):
+    if columns is None:
+      columns=[[] for arr in batch]
+    for values,arr in zip(columns,batch):
+      values.extend(strings(arr))
+  if columns is None:
+    columns=[[] for c in (range(len(columnNames(filename))) if cols is None else cols)]
+  return columns
+
+#tab delimited text of a Parquet or Arrow file one batch at a time, header line first, for readers of text files
+def textChunks(filename):
+  yield "\t".join(columnNames(filename))+"\n"
+  for batch in readBatches(filename):
+    rows=zip(*[strings(arr) for arr in batch])
+    if rows:
+      yield "\n".join(["\t".join(x) for x in rows])+"\n"
+
+#table of named columns, each a list of text values, a NumPy array (NaN is null) or an Arrow array
+def makeTable(names,columns):
+  requireArrow()
+  arrays=[]
+  for values in columns:
+    if isinstance(values,np.ndarray):
+      arrays.append(pa.array(values,from_pandas=True))
+    elif isinstance(values,list):
+      arrays.append(pa.array([None if x=="NA" else x for x in values],type=pa.string()))
+    else:
+      arrays.append(values)
+  return pa.Table.from_arrays(arrays,names=list(names))
+
+#write named columns as Parquet or Arrow IPC, chosen by fmt or the file name (see outputFormat)
+def writeTable(filename,names,columns,fmt=None):
+  table=makeTable(names,columns)
+  if (fmt or outputFormat(filename))=="parquet":
+    pq.write_table(table,filename)
+  else:
+    writer=pa.RecordBatchFileWriter(filename,table.schema)
+    writer.write_table(table)
+    writer.close()
+
+#every column of a Parquet or Arrow file as Arrow arrays, rows taken in the order given (all rows if None)
+def readArrays(filename,rows=None):
+  requireArrow()
+  batches=list(readBatches(filename))
+  arrays=[]
+  for c in range(len(columnNames(filename))):
+    chunks=[batch[c] for batch in batches]
+    arr=pa.concat_arrays(chunks) if chunks else pa.array([],type=readSchema(filename).types[c])
+    arrays.append(arr if rows is None else arr.take(pa.array(np.asarray(rows,dtype=np.int64))))
+  return arrays
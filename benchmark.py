@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Benchmarks of the proxyPower readers and proxy-case assignment on synthetic biobanks of 10k to 1M samples.
+# Every stage runs in a forked process so its time and peak memory are its own, inputs it does not read itself are
+# loaded before the fork. One row per stage and size is appended to a tab delimited results file with the git revision,
+# so runs of different versions in the same file show regressions.
+############################
+##### IMPORT MODULES #######
+###########################
+import argparse
+import json, os, resource, shutil, subprocess, sys, tempfile, time, traceback
+import numpy as np
+import compressedIO
+import famHxFinder
+import kinshipGraph
+import proxyCaseAssign1dr
+import proxyCaseAssignAffRel
+import proxyEngine
+import proxyModel
+
+###########################
+##### PARSE ARGUMENTS ####
+###########################
+def get_settings():
+  parser=argparse.ArgumentParser(
+  description='''Script to generate synthetic biobanks (KING kinship, phenotype and GRS files) and time the proxyPower readers, proxy-case assignment, relative counts, GRS matching and model updates on them. Results are appended to a tab delimited file''')
+  parser.add_argument("-o","--output",help="Tab delimited results file, one line per stage and number of samples is appended with the git revision, seconds, rows/s, edges/s and peak memory",type=str,required=True)
+  parser.add_argument("-n","--samples",help="Comma separated numbers of samples, k and M suffixes allowed [default=10k,100k,1M]",type=str,default="10k,100k,1M")
+  parser.add_argument("-d","--dataDir",help="Directory for the synthetic files, one subdirectory per number of samples. Kept and reused by later runs with the same generator settings [default=temporary directory removed at exit]",type=str)
+  parser.add_argument("-w","--width",help="Number of columns of the phenotype file, columns past the fixed and trait columns are filler [default=20]",type=int,default=20)
+  parser.add_argument("-v","--prevalence",help="Case prevalence of every trait [default=0.05]",type=float,default=0.05)
+  parser.add_argument("-sr","--selfReport",help="Number of traits, each with its 1dr columns (PHE, REL) and AffRel columns (CASE, M, F, S) [default=1]",type=int,default=1)
+  parser.add_argument("-m","--missing",help="Fraction of NA values in the case and self report columns [default=0.02]",type=float,default=0.02)
+  parser.add_argument("-g","--scores",help="Number of GRS columns [default=1]",type=int,default=1)
+  parser.add_argument("-dp","--distant",help="Second and third degree pairs per sample in the kinship file [default=0.2]",type=float,default=0.2)
+  parser.add_argument("-up","--unrelated",help="Unrelated pairs per sample in the kinship file [default=1]",type=float,default=1.0)
+  parser.add_argument("-s","--seed",help="Seed of the generator [default=1]",type=int,default=1)
+  parser.add_argument("-t","--threads",help="Number of processes given to the readers and the parallel assignment [default=1]",type=int,default=1)
+  parser.add_argument("-r","--repeats",help="Runs of every stage, the fastest time and largest memory are reported [default=1]",type=int,default=1)
+  parser.add_argument("-st","--stages",help="Comma separated stage name prefixes to run, such as readKinship,proxy_via_kinship. proxy_via_selfreport also runs the proxy_via_selfreport_minus_kinship and _plus_kinship stages, proxy_via_selfreport. runs only the stage itself. A prefix matching no stage is an error [default=all]",type=str)
+  parser.add_argument("-go","--generateOnly",help="Write the synthetic files to --dataDir and stop",action="store_true")
+  args=parser.parse_args()
+  return args
+
+############################
+######### FUNCTIONS ########
+############################
+
+DATA_VERSION=1 #bump when the generator changes so old data directories are rebuilt
+BLOCK_LINES=100000 #lines formatted per write
+FAMILY_SIZES=[1,2,3,4,5,6] #samples per family of first degree relatives, two parents and their children from 3 on
+FAMILY_P=[0.4,0.25,0.15,0.1,0.06,0.04]
+FIXED=["IID","FID","PATID","MATID","Sex","BirthYear","batch","PC1","PC2","PC3","PC4"]
+TRAIT=["PHE","REL","CASE","M","F","S"] #columns of each trait, 1dr coding (2 case, 1 control) then AffRel coding (1 case, 0 control)
+CODES_1DR=["NA","1","2"] #status code+1 to 1dr string
+CODES_AFFREL=["NA","0","1"] #status code+1 to AffRel string
+F_VALUES=["0","0.25","0.5","1","NA"]
+F_P=[0.8,0.02,0.1,0.05,0.03]
+F_MODEL=4 #model written by the updateF stage
+RESULT_COLUMNS=["revision","date","stage","samples","kinshipLines","phenoColumns","threads","seconds","rows","edges","rowsPerSecond","edgesPerSecond","peakMB","memoryMB"]
+
+#numbers of samples from a comma separated list, k and M suffixes are thousands and millions
+def parse_sizes(value):
+  sizes=[]
+  for field in value.split(","):
+    field=field.strip()
+    scale={"k":1000,"K":1000,"m":1000000,"M":1000000}.get(field[-1:],1)
+    sizes.append(int(float(field.rstrip("kKmM"))*scale))
+  return sizes
+
+#pairs (i, j) of first degree relatives within a family of size members, the two parents (0 and 1) are not related
+def familyPairs(size):
+  if size==2:
+    return [(0,1)]
+  children=range(2,size)
+  return [(p,c) for p in (0,1) for c in children]+[(a,b) for a in children for b in children if a < b]
+
+#families as sample ranges, returns family number of every sample and first degree pairs (i, j) as arrays
+def makeFamilies(rng,samples):
+  sizes=rng.choice(FAMILY_SIZES,samples,p=FAMILY_P)
+  ends=np.cumsum(sizes)
+  k=np.searchsorted(ends,samples)+1
+  sizes=sizes[:k]
+  sizes[-1]-=ends[k-1]-samples
+  starts=np.cumsum(sizes)-sizes
+  src=[]
+  dst=[]
+  for size in FAMILY_SIZES[1:]:
+    pairs=np.array(familyPairs(size),dtype=np.int64)
+    first=starts[sizes==size]
+    src.append((first[:,None]+pairs[:,0]).ravel())
+    dst.append((first[:,None]+pairs[:,1]).ravel())
+  return np.repeat(np.arange(k),sizes),np.concatenate(src),np.concatenate(dst)
+
+#random pairs of samples in different families, without repeats, the first distant are second or third degree and the rest unrelated
+def randomPairs(rng,family,distant,unrelated):
+  n=len(family)
+  i=rng.randint(0,n,distant+unrelated)
+  j=rng.randint(0,n,distant+unrelated)
+  keep=family[i]!=family[j]
+  key,first=np.unique(np.minimum(i,j)[keep]*n+np.maximum(i,j)[keep],return_index=True)
+  key=key[np.argsort(first)] #draw order, so the distant pairs stay first
+  return key//n,key%n,min(distant,len(key))
+
+#write KING .kin0 file of first degree pairs, distant pairs and unrelated pairs in random order, returns number of pairs
+def writeKinship(file,rng,ids,family,src,dst,distant,unrelated):
+  first=len(src)
+  i,j,close=randomPairs(rng,family,distant,unrelated)
+  src=np.concatenate([src,i])
+  dst=np.concatenate([dst,j])
+  kin=np.concatenate([np.clip(rng.normal(0.25,0.02,first),0.2,0.3),
+                      np.where(rng.random_sample(close) < 0.5,rng.uniform(0.09,0.17,close),rng.uniform(0.045,0.088,close)),
+                      rng.uniform(-0.05,0.04,len(i)-close)])
+  order=rng.permutation(len(src))
+  swap=rng.random_sample(len(src)) < 0.5
+  src,dst=np.where(swap,dst,src)[order],np.where(swap,src,dst)[order]
+  kin=kin[order]
+  nSNP=rng.randint(480000,520000,len(src))
+  hetHet=rng.uniform(0.05,0.15,len(src))
+  ibs0=rng.uniform(0,0.02,len(src))
+  f=compressedIO.openOutput(file)
+  f.write("\t".join(["FID1","ID1","FID2","ID2","N_SNP","HetHet","IBS0","Kinship"])+"\n")
+  for start in range(0,len(src),BLOCK_LINES):
+    end=start+BLOCK_LINES
+    rows=zip(src[start:end].tolist(),dst[start:end].tolist(),nSNP[start:end].tolist(),hetHet[start:end].tolist(),ibs0[start:end].tolist(),kin[start:end].tolist())
+    f.write("".join(["%s\t%s\t%s\t%s\t%d\t%.4f\t%.4f\t%.4f\n" % (ids[a],ids[a],ids[b],ids[b],n,h,z,k) for a,b,n,h,z,k in rows]))
+  f.close()
+  return len(src)
+
+#status codes (-1 missing, 0 control, 1 case) of flags with NA at the missing rate
+def withMissing(rng,flags,missing):
+  status=flags.astype(np.int8)
+  status[rng.random_sample(len(flags)) < missing]=-1
+  return status
+
+#status codes of the TRAIT columns of one trait: case, self report of any affected first degree relative, case again and self report of mother, father and sibling
+#relatives in the cohort who are cases are reported most of the time, relatives outside the cohort at twice the prevalence
+def makeTrait(rng,samples,src,dst,prevalence,missing):
+  case=rng.random_sample(samples) < prevalence
+  caseRelative=np.zeros(samples,dtype=bool)
+  caseRelative[src[case[dst]]]=True
+  caseRelative[dst[case[src]]]=True
+  report=np.where(caseRelative,0.8,min(1.0,2*prevalence))
+  status=withMissing(rng,case,missing)
+  relatives=[withMissing(rng,rng.random_sample(samples) < p,missing) for p in (report,report/2,report/2,report/2)]
+  return [status,relatives[0],status]+relatives[1:]
+
+#values of the FIXED columns of every sample
+def makeFixed(rng,samples):
+  return {"Sex":rng.randint(1,3,samples),"BirthYear":rng.randint(1930,1991,samples),"batch":rng.randint(1,11,samples),"PC":rng.normal(0,0.01,(samples,4))}
+
+#FIXED columns of samples start to end as lists of strings
+def fixedBlock(ids,fixed,start,end):
+  block=ids[start:end]
+  zeros=["0"]*len(block)
+  pcs=fixed["PC"][start:end]
+  return [block,block,zeros,zeros,map(str,fixed["Sex"][start:end].tolist()),map(str,fixed["BirthYear"][start:end].tolist()),
+          ["b%d" % x for x in fixed["batch"][start:end].tolist()]]+[["%.4f" % x for x in pcs[:,k].tolist()] for k in range(4)]
+
+#write lines of column lists in blocks of BLOCK_LINES samples, columns(start, end) gives the string columns of one block
+def writeTable(file,header,samples,columns):
+  f=compressedIO.openOutput(file)
+  f.write("\t".join(header)+"\n")
+  for start in range(0,samples,BLOCK_LINES):
+    f.write("".join(["\t".join(row)+"\n" for row in zip(*columns(start,start+BLOCK_LINES))]))
+  f.close()
+
+#write phenotype file: FIXED columns, TRAIT columns of every trait, then filler columns of integers up to width columns
+def writePheno(file,rng,ids,fixed,traits,width):
+  codes=[CODES_1DR,CODES_1DR]+[CODES_AFFREL]*4
+  filler=rng.randint(0,100,(len(ids),max(0,width-len(FIXED)-len(TRAIT)*len(traits)))).astype(np.int8)
+  header=FIXED+[name+str(t+1) for t in range(len(traits)) for name in TRAIT]+["X%d" % (k+1) for k in range(filler.shape[1])]
+  def columns(start,end):
+    block=fixedBlock(ids,fixed,start,end)
+    for trait in traits:
+      block+=[[code[x+1] for x in status[start:end].tolist()] for code,status in zip(codes,trait)]
+    return block+[map(str,filler[start:end,k].tolist()) for k in range(filler.shape[1])]
+  writeTable(file,header,len(ids),columns)
+
+#write proxyModel.py input: FIXED columns and F
+def writeF(file,rng,ids,fixed):
+  F=rng.choice(len(F_VALUES),len(ids),p=F_P)
+  writeTable(file,FIXED+["F"],len(ids),lambda start,end: fixedBlock(ids,fixed,start,end)+[[F_VALUES[x] for x in F[start:end].tolist()]])
+
+#write GRS file: IID then normal scores, NA at the missing rate
+def writeGRS(file,rng,ids,scores,missing):
+  grs=rng.normal(0,1,(len(ids),scores))
+  grs[rng.random_sample(grs.shape) < missing]=np.nan
+  def columns(start,end):
+    return [ids[start:end]]+[["NA" if x!=x else "%.5f" % x for x in grs[start:end,k].tolist()] for k in range(scores)]
+  writeTable(file,["IID"]+["GRS%d" % (k+1) for k in range(scores)],len(ids),columns)
+
+#files of a data directory
+def dataFiles(directory):
+  return dict((name,os.path.join(directory,file)) for name,file in [("kinship","kinship.kin0"),("pheno","pheno.txt"),("F","F.txt"),("grs","grs.txt")])
+
+#write synthetic biobank of samples into directory unless it holds one made with the same settings, returns its metadata
+#families of first degree relatives are consecutive samples, so a kinship file of the pairs in random order has the locality of real cohorts
+def makeBiobank(directory,samples,settings):
+  settings=dict(settings,samples=samples,version=DATA_VERSION)
+  meta=kinshipGraph.readMeta(directory)
+  if meta is not None and meta["settings"]==settings:
+    print >> sys.stderr, "Reusing synthetic biobank in %s\n" % directory
+    return meta
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  if meta is not None:
+    os.remove(os.path.join(directory,"meta.json")) #files are rewritten below
+  rng=np.random.RandomState(settings["seed"])
+  ids=["S%d" % i for i in range(samples)]
+  files=dataFiles(directory)
+  family,src,dst=makeFamilies(rng,samples)
+  lines=writeKinship(files["kinship"],rng,ids,family,src,dst,int(samples*settings["distant"]),int(samples*settings["unrelated"]))
+  fixed=makeFixed(rng,samples)
+  traits=[makeTrait(rng,samples,src,dst,settings["prevalence"],settings["missing"]) for t in range(settings["selfReport"])]
+  writePheno(files["pheno"],rng,ids,fixed,traits,settings["width"])
+  writeF(files["F"],rng,ids,fixed)
+  writeGRS(files["grs"],rng,ids,settings["scores"],settings["missing"])
+  meta={"settings":settings,"kinshipLines":lines,"firstDegreePairs":len(src),"phenoColumns":max(settings["width"],len(FIXED)+len(TRAIT)*settings["selfReport"])}
+  with open(os.path.join(directory,"meta.json"),"w") as f:
+    json.dump(meta,f,sort_keys=True)
+  print >> sys.stderr, "Wrote synthetic biobank of %d samples and %d kinship pairs to %s\n" % (samples,lines,directory)
+  return meta
+
+#resident memory of this process in MB
+def residentMB():
+  try:
+    with open("/proc/self/statm") as f:
+      return int(f.read().split()[1])*resource.getpagesize()/1048576.0
+  except IOError:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+
+#run one stage in a forked process: setup() untimed, then run(setup result) timed
+#returns seconds, peak resident memory in MB and its growth over the memory at the start of run, None if the stage failed
+def runStage(setup,run):
+  sys.stdout.flush()
+  sys.stderr.flush()
+  read,write=os.pipe()
+  pid=os.fork()
+  if pid==0:
+    os.close(read)
+    code=0
+    try:
+      data=setup() if setup is not None else None
+      start=residentMB()
+      t=time.time()
+      run(data)
+      seconds=time.time()-t
+      peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+      os.write(write,json.dumps([seconds,peak,max(0.0,peak-start)]))
+    except Exception:
+      traceback.print_exc()
+      code=1
+    os.close(write)
+    os._exit(code)
+  os.close(write)
+  f=os.fdopen(read)
+  result=f.read()
+  f.close()
+  os.waitpid(pid,0)
+  return json.loads(result) if result else None
+
+#stages of one assignment script: (name, setup, run, rows, edges)
+def scriptStages(label,module,file,ps,kg,traits,edges,threads,scratch):
+  F=module.proxy_via_selfreport(ps,False,*traits[0])
+  cp=traits[0][0]
+  first=edges[kinshipGraph.DEGREE_FIRST]
+  return [("readPheno."+label,None,lambda data: module.readPheno(file,traits,threads),len(ps),None),
+          ("proxy_via_selfreport."+label,None,lambda data: module.proxy_via_selfreport(ps,False,*traits[0]),len(ps),None),
+          ("proxy_via_kinship."+label,None,lambda data: module.proxy_via_kinship(ps,kg,False,cp),len(ps),first),
+          ("proxy_via_selfreport_minus_kinship."+label,None,lambda data: module.proxy_via_selfreport_minus_kinship(F,kg),len(ps),first),
+          ("proxy_via_selfreport_plus_kinship."+label,None,lambda data: module.proxy_via_selfreport_plus_kinship(F,kg),len(ps),first)]
+
+#every stage on the files of one data directory, inputs a stage does not read itself are read here, before the stages are forked
+#the kinship graph keeps the relatives up to third degree among the phenotyped samples, as proxyCaseAssign1dr.py --number reads it
+def benchmarkStages(files,meta,threads,scratch):
+  traits=meta["settings"]["selfReport"]
+  base=[len(FIXED)+len(TRAIT)*t for t in range(traits)]
+  traits1dr=[(b,b+1) for b in base]
+  traitsAffRel=[(b+2,b+3,b+4,b+5) for b in base]
+  degrees=range(kinshipGraph.DEGREE_UNRELATED)
+  ps1dr=proxyCaseAssign1dr.readPheno(files["pheno"],traits1dr,threads)
+  psAffRel=proxyCaseAssignAffRel.readPheno(files["pheno"],traitsAffRel,threads)
+  kg=kinshipGraph.readKinship(files["kinship"],None,ps1dr.ids,degrees,threads)
+  edges={None:len(kg.indices)//2,kinshipGraph.DEGREE_FIRST:int(np.count_nonzero(kg.degree==kinshipGraph.DEGREE_FIRST))//2}
+  grsIDs,grsNames,grsScores=famHxFinder.readGRS(files["grs"])
+  samples=len(ps1dr)
+
+  stages=[("readKinship",None,lambda data: kinshipGraph.readKinship(files["kinship"],None,ps1dr.ids,degrees,threads),meta["kinshipLines"],edges[None])]
+  stages+=scriptStages("1dr",proxyCaseAssign1dr,files["pheno"],ps1dr,kg,traits1dr,edges,threads,scratch)
+  stages+=scriptStages("AffRel",proxyCaseAssignAffRel,files["pheno"],psAffRel,kg,traitsAffRel,edges,threads,scratch)
+  F=proxyCaseAssign1dr.proxy_via_selfreport(ps1dr,False,*traits1dr[0])
+  stages+=[("count_relatives",None,lambda data: proxyEngine.count_relatives(os.path.join(scratch,"counts.txt"),kg,ps1dr,[F],threads=threads),samples,edges[None])]
+  stages+=[("readPheno.famHxFinder",None,lambda data: famHxFinder.readPheno(files["pheno"],True,0),samples,None),
+           ("proxy_via_kinship.famHxFinder",lambda: famHxFinder.readPheno(files["pheno"],True,0),lambda data: famHxFinder.proxy_via_kinship(data[0],kg,data[1],traitsAffRel[0][0]),samples,edges[kinshipGraph.DEGREE_FIRST]),
+           ("readGRS",None,lambda data: famHxFinder.readGRS(files["grs"]),len(grsIDs),None),
+           ("match_grs",None,lambda data: famHxFinder.match_grs(grsIDs,grsNames,grsScores,kg,os.path.join(scratch,"grs"),threads=threads),len(grsIDs),edges[kinshipGraph.DEGREE_FIRST]),
+           ("updateF",None,lambda data: proxyModel.updateF(files["F"],len(FIXED),F_MODEL,os.path.join(scratch,"F.txt"),threads),samples,None)]
+  return stages
+
+#True if the stage name starts with a prefix listed in wanted, every stage if wanted is None
+def selected(name,wanted):
+  return wanted is None or any(name.startswith(x) for x in wanted)
+
+#prefixes of wanted that start no stage name
+def unmatched(names,wanted):
+  return [x for x in wanted or [] if not any(name.startswith(x) for name in names)]
+
+#rate per second as string, NA without a count
+def rate(count,seconds):
+  return "NA" if count is None or seconds <= 0 else "%.1f" % (count/seconds)
+
+#git revision of this script, with -dirty for uncommitted changes, NA outside a git checkout
+def revision():
+  try:
+    with open(os.devnull,"w") as null:
+      return subprocess.check_output(["git","describe","--always","--dirty"],cwd=os.path.dirname(os.path.abspath(__file__)),stderr=null).strip()
+  except (OSError,subprocess.CalledProcessError):
+    return "NA"
+
+#append result lines to file, with a header if the file is new or empty
+def writeResults(file,rows):
+  header=not os.path.isfile(file) or os.path.getsize(file)==0
+  f=open(file,"a")
+  if header:
+    f.write("\t".join(RESULT_COLUMNS)+"\n")
+  for row in rows:
+    f.write("\t".join([str(x) for x in row])+"\n")
+  f.close()
+
+#########################
+########## MAIN #########
+#########################
+
+def main():
+  args=get_settings()
+  if args.generateOnly and args.dataDir is None:
+    print >> sys.stderr, "Please give --dataDir with --generateOnly.\n"
+    sys.exit(1)
+  settings={"width":args.width,"prevalence":args.prevalence,"selfReport":args.selfReport,"missing":args.missing,"scores":args.scores,
+            "distant":args.distant,"unrelated":args.unrelated,"seed":args.seed}
+  wanted=[x.strip() for x in args.stages.split(",")] if args.stages is not None else None
+  dataDir=args.dataDir if args.dataDir is not None else tempfile.mkdtemp()
+  scratch=tempfile.mkdtemp()
+  rev=revision()
+  try:
+    for samples in parse_sizes(args.samples):
+      directory=os.path.join(dataDir,"n%d" % samples)
+      meta=makeBiobank(directory,samples,settings)
+      if args.generateOnly:
+        continue
+      rows=[]
+      stages=benchmarkStages(dataFiles(directory),meta,args.threads,scratch)
+      missing=unmatched([stage[0] for stage in stages],wanted)
+      if missing:
+        print >> sys.stderr, "No stage starts with %s, the stages are %s\n" % (",".join(missing),",".join([stage[0] for stage in stages]))
+        sys.exit(1)
+      for name,setup,run,count,edges in stages:
+        if not selected(name,wanted):
+          continue
+        results=[runStage(setup,run) for r in range(args.repeats)]
+        if None in results:
+          print >> sys.stderr, "Stage %s failed on %d samples\n" % (name,samples)
+          continue
+        seconds=min([x[0] for x in results])
+        peak=max([x[1] for x in results])
+        memory=max([x[2] for x in results])
+        print >> sys.stderr, "%s on %d samples: %.3f s, %s rows/s, %s edges/s, %.1f MB peak, %.1f MB used\n" % (name,samples,seconds,rate(count,seconds),rate(edges,seconds),peak,memory)
+        rows.append([rev,time.strftime("%Y-%m-%d %H:%M:%S"),name,samples,meta["kinshipLines"],meta["phenoColumns"],args.threads,"%.4f" % seconds,
+                     count,"NA" if edges is None else edges,rate(count,seconds),rate(edges,seconds),"%.1f" % peak,"%.1f" % memory])
+      writeResults(args.output,rows)
+  finally:
+    shutil.rmtree(scratch)
+    if args.dataDir is None:
+      shutil.rmtree(dataDir)
+
+#call main
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Text input and output shared by every script. On input plain text, gzip, bgzip and zstd are detected from
+# the first bytes of the file (or standard input for -). On output the format follows the file name:
+# .gz and .bgz write bgzip (readable by gzip and splittable by kinshipGraph.py), .zst writes zstd, anything else plain text.
+# bgzip is made of independent blocks, so with threads > 1 blocks are (de)compressed in a thread pool (zlib releases the GIL).
+# gzip is decompressed in a background thread and zstd uses the zstandard module, or the zstd command line tool without it.
+# Parquet and Arrow IPC files (see arrowIO.py) are read as tab delimited text with a header line.
+############################
+##### IMPORT MODULES #######
+###########################
+import gzip, struct, subprocess, sys, threading, zlib
+import Queue
+from distutils.spawn import find_executable
+from itertools import chain, islice
+from multiprocessing.pool import ThreadPool
+import arrowIO
+try:
+  import zstandard #optional, the zstd command line tool is used without it
+except ImportError:
+  zstandard=None
+
+############################
+######### FUNCTIONS ########
+############################
+
+GZIP_MAGIC="\x1f\x8b"
+ZSTD_MAGIC="\x28\xb5\x2f\xfd"
+READ_BYTES=1<<20 #compressed bytes read at a time
+WRITE_BUFFER=1<<20 #buffer size of plain text output
+BGZF_BLOCK=65280 #uncompressed bytes per BGZF block, as written by bgzip
+BGZF_BATCH=64 #BGZF blocks per thread and batch handed to the thread pool
+BGZF_EOF="\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00" #empty block ending every bgzip file
+GZIP_LEVEL=6
+ZSTD_LEVEL=3
+QUEUE_CHUNKS=16 #decompressed chunks a background thread may read ahead
+
+#plain, gzip, bgzip, zstd, parquet or arrow from the first 18 bytes of a file (bgzip is gzip with a BC extra subfield in every block)
+def headFormat(head):
+  if head[:4]==ZSTD_MAGIC:
+    return "zstd"
+  if head[:4]=="PAR1":
+    return "parquet"
+  if head[:6]=="ARROW1":
+    return "arrow"
+  if head[:2]!=GZIP_MAGIC:
+    return "plain"
+  if len(head)>=18 and ord(head[3]) & 4 and head[12:14]=="BC":
+    return "bgzip"
+  return "gzip"
+
+def fileFormat(filename):
+  with open(filename,"rb") as f:
+    return headFormat(f.read(18))
+
+COMPRESSED_EXTENSIONS={".gz":"bgzip",".bgz":"bgzip",".zst":"zstd",".zstd":"zstd"}
+
+#output format from the file name
+def outputFormat(filename):
+  return COMPRESSED_EXTENSIONS.get(splitCompressed(filename)[1],"plain")
+
+#file name without its compression extension and the extension (empty string for plain text)
+def splitCompressed(filename):
+  for ext in COMPRESSED_EXTENSIONS:
+    if filename.endswith(ext):
+      return filename[:-len(ext)],ext
+  return filename,""
+
+#add suffix to a file name before its compression, Parquet or Arrow extension, e.g. out.gz and .PHE give out.PHE.gz
+def insertSuffix(filename,suffix):
+  stem,ext=splitCompressed(filename)
+  for arrowExt in arrowIO.EXTENSIONS:
+    if not ext and stem.endswith(arrowExt):
+      stem,ext=stem[:-len(arrowExt)],arrowExt
+  return stem+suffix+ext
+
+#output file name with the extension of --compress (gz or zst) added, unchanged if compress is None
+def compressedName(name,compress=None):
+  return ".".join([name,compress]) if compress else name
+
+#text lines from an iterator of decompressed chunks, behaves like a file opened for reading
+class ChunkReader(object):
+  def __init__(self,chunks,closers=()):
+    self.chunks=iter(chunks)
+    self.closers=list(closers) #called once on close, e.g. to close the compressed file
+    self.lines=[] #complete lines of the current chunk, last line first
+    self.rest="" #start of a line continued in the next chunk
+
+  def fill(self):
+    for chunk in self.chunks:
+      lines=(self.rest+chunk).split("\n")
+      self.rest=lines.pop()
+      if lines:
+        self.lines=[x+"\n" for x in reversed(lines)]
+        return True
+    if self.rest:
+      self.lines=[self.rest]
+      self.rest=""
+      return True
+    return False
+
+  def readline(self):
+    if not self.lines and not self.fill():
+      return ""
+    return self.lines.pop()
+
+  def __iter__(self):
+    return self
+
+  def next(self):
+    line=self.readline()
+    if not line:
+      raise StopIteration
+    return line
+
+  def close(self):
+    closers,self.closers=self.closers,[]
+    for close in closers:
+      close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*exc):
+    self.close()
+
+#raw chunks of a file, or of standard input for -, with the format found in the first bytes
+def rawChunks(filename):
+  f=sys.stdin if filename=="-" else open(filename,"rb")
+  head=f.read(18)
+  closers=[] if f is sys.stdin else [f.close]
+  return headFormat(head),chain([head],iter(lambda: f.read(READ_BYTES),"")),closers
+
+#decompress gzip data, a new member (as in bgzip or concatenated gzip files) starts where the last one ended
+def gunzipChunks(chunks):
+  d=zlib.decompressobj(16+zlib.MAX_WBITS)
+  for chunk in chunks:
+    while chunk:
+      data=d.decompress(chunk)
+      if data:
+        yield data
+      chunk=d.unused_data
+      if chunk:
+        d=zlib.decompressobj(16+zlib.MAX_WBITS)
+  data=d.flush()
+  if data:
+    yield data
+
+#split bgzip data into BGZF blocks using the BSIZE field of each block header
+def bgzfBlocks(chunks):
+  data=""
+  for chunk in chunks:
+    data+=chunk
+    start=0
+    while len(data)-start >= 18:
+      xlen=struct.unpack("<H",data[start+10:start+12])[0]
+      if len(data)-start < 12+xlen:
+        break
+      bsize=None
+      i=start+12
+      while i < start+12+xlen:
+        slen=struct.unpack("<H",data[i+2:i+4])[0]
+        if data[i:i+2]=="BC":
+          bsize=struct.unpack("<H",data[i+4:i+6])[0]
+        i+=4+slen
+      if bsize is None:
+        raise IOError("not a bgzip file, block at byte %d of a chunk has no BSIZE" % start)
+      if len(data)-start < bsize+1:
+        break
+      yield data[start:start+bsize+1]
+      start+=bsize+1
+    data=data[start:]
+  if data:
+    raise IOError("bgzip file ends inside a block")
+
+#decompress one BGZF block
+def inflateBGZF(block):
+  xlen=struct.unpack("<H",block[10:12])[0]
+  return zlib.decompress(block[12+xlen:-8],-15)
+
+#compress one BGZF block of at most BGZF_BLOCK bytes, stored uncompressed if deflate would not fit in a block
+def deflateBGZF(data,level=GZIP_LEVEL):
+  c=zlib.compressobj(level,zlib.DEFLATED,-15)
+  cdata=c.compress(data)+c.flush()
+  if len(cdata) > 65536-26:
+    c=zlib.compressobj(0,zlib.DEFLATED,-15)
+    cdata=c.compress(data)+c.flush()
+  head="\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"+struct.pack("<H",len(cdata)+25)
+  return head+cdata+struct.pack("<II",zlib.crc32(data) & 0xffffffff,len(data) & 0xffffffff)
+
+#apply f to batches of items in a thread pool, results come back in order while the next batch is being processed
+def poolMap(f,items,threads,batch=BGZF_BATCH):
+  pool=ThreadPool(threads)
+  items=iter(items)
+  pending=None
+  try:
+    for work in iter(lambda: list(islice(items,batch*threads)),[]):
+      result=pool.map_async(f,work)
+      if pending is not None:
+        for x in pending.get():
+          yield x
+      pending=result
+    if pending is not None:
+      for x in pending.get():
+        yield x
+  finally:
+    pool.close()
+    pool.join()
+
+#iterate chunks in a daemon thread that reads ahead, so decompression overlaps with parsing
+def background(chunks,size=QUEUE_CHUNKS):
+  q=Queue.Queue(size)
+  def run():
+    try:
+      for chunk in chunks:
+        q.put((chunk,None))
+    except Exception as e:
+      q.put((None,e))
+    q.put((None,None))
+  t=threading.Thread(target=run)
+  t.daemon=True
+  t.start()
+  while True:
+    chunk,error=q.get()
+    if error is not None:
+      raise error
+    if chunk is None:
+      return
+    yield chunk
+
+#decompress zstd data with the zstandard module, or by piping it through the zstd command line tool
+def unzstdChunks(chunks,closers):
+  if zstandard is not None:
+    d=zstandard.ZstdDecompressor().decompressobj()
+    return (d.decompress(chunk) for chunk in chunks)
+  if find_executable("zstd") is None:
+    raise IOError("reading zstd files needs the zstandard module or the zstd command line tool")
+  proc=subprocess.Popen(["zstd","-d","-c","-q"],stdin=subprocess.PIPE,stdout=subprocess.PIPE)
+  def feed():
+    try:
+      for chunk in chunks:
+        proc.stdin.write(chunk)
+    except IOError: #zstd exited early, its error is reported on close
+      pass
+    proc.stdin.close()
+  t=threading.Thread(target=feed)
+  t.daemon=True
+  t.start()
+  def close():
+    proc.stdout.close()
+    if proc.wait() not in (0,-13): #-13 is SIGPIPE when the reader stops early
+      raise IOError("zstd exited with status %d" % proc.returncode)
+  closers.insert(0,close)
+  return iter(lambda: proc.stdout.read(READ_BYTES),"")
+
+#open a plain, gzip, bgzip or zstd text file for reading, or standard input for -
+#with threads > 1 bgzip blocks are decompressed in a thread pool and gzip in a background thread
+#a Parquet or Arrow file is read as tab delimited text with a header line
+def openInput(filename,threads=1):
+  if filename!="-":
+    fmt=fileFormat(filename)
+    if fmt=="plain":
+      return open(filename,"r")
+    if fmt in arrowIO.FORMATS:
+      return ChunkReader(arrowIO.textChunks(filename))
+  fmt,chunks,closers=rawChunks(filename)
+  if fmt in arrowIO.FORMATS:
+    raise IOError("Parquet and Arrow files can not be read from standard input")
+  if fmt=="bgzip" and threads > 1:
+    chunks=poolMap(inflateBGZF,bgzfBlocks(chunks),threads)
+  elif fmt=="gzip" or fmt=="bgzip":
+    chunks=gunzipChunks(chunks)
+    if threads > 1:
+      chunks=background(chunks)
+  elif fmt=="zstd":
+    chunks=unzstdChunks(chunks,closers)
+  return ChunkReader(chunks,closers)
+
+#bgzip writer, text is cut into BGZF blocks that are compressed in a thread pool with threads > 1
+class BGZFWriter(object):
+  def __init__(self,raw,threads=1,level=GZIP_LEVEL):
+    self.raw=raw
+    self.level=level
+    self.pool=ThreadPool(threads) if threads > 1 else None
+    self.batch=BGZF_BLOCK*BGZF_BATCH*max(threads,1) #bytes buffered before compressing
+    self.buffer=[]
+    self.size=0
+    self.pending=None #blocks being compressed by the pool
+
+  def write(self,data):
+    self.buffer.append(data)
+    self.size+=len(data)
+    if self.size >= self.batch:
+      self.flushBlocks(False)
+
+  def writePending(self):
+    if self.pending is not None:
+      self.raw.write("".join(self.pending.get()))
+      self.pending=None
+
+  def flushBlocks(self,final):
+    data="".join(self.buffer)
+    end=len(data) if final else len(data)-len(data)%BGZF_BLOCK
+    blocks=[data[i:i+BGZF_BLOCK] for i in xrange(0,end,BGZF_BLOCK)]
+    self.buffer=[data[end:]]
+    self.size=len(data)-end
+    if self.pool is None:
+      self.raw.write("".join(deflateBGZF(x,self.level) for x in blocks))
+    else:
+      result=self.pool.map_async(lambda x: deflateBGZF(x,self.level),blocks)
+      self.writePending()
+      self.pending=result
+
+  def flush(self):
+    self.raw.flush()
+
+  def close(self):
+    if self.raw.closed:
+      return
+    self.flushBlocks(True)
+    self.writePending()
+    self.raw.write(BGZF_EOF)
+    self.raw.close()
+    if self.pool is not None:
+      self.pool.close()
+      self.pool.join()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*exc):
+    self.close()
+
+#zstd writer using the zstandard module, or the zstd command line tool without it
+class ZstdWriter(object):
+  def __init__(self,raw,threads=1,level=ZSTD_LEVEL):
+    self.raw=raw
+    self.proc=None
+    if zstandard is not None:
+      self.out=zstandard.ZstdCompressor(level=level,threads=threads if threads > 1 else 0).stream_writer(raw)
+    elif find_executable("zstd") is not None:
+      self.proc=subprocess.Popen(["zstd","-c","-q","-%d" % level,"-T%d" % threads],stdin=subprocess.PIPE,stdout=raw)
+      self.out=self.proc.stdin
+    else:
+      raw.close()
+      raise IOError("writing zstd files needs the zstandard module or the zstd command line tool")
+
+  def write(self,data):
+    self.out.write(data)
+
+  def flush(self):
+    self.out.flush()
+
+  def close(self):
+    if self.raw.closed:
+      return
+    self.out.close()
+    if self.proc is not None and self.proc.wait()!=0:
+      raise IOError("zstd exited with status %d" % self.proc.returncode)
+    if not self.raw.closed:
+      self.raw.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self,*exc):
+    self.close()
+
+#open a text file for writing, compressed as chosen by fmt or the file name (see outputFormat), or standard output for -
+#gzip writes a single member gzip file with one thread, bgzip is the default for .gz as it can be (de)compressed in parallel
+def openOutput(filename,threads=1,fmt=None):
+  if filename=="-":
+    return sys.stdout
+  if fmt is None:
+    fmt=outputFormat(filename)
+  if fmt=="plain":
+    return open(filename,"w",WRITE_BUFFER)
+  if fmt=="gzip":
+    return gzip.open(filename,"wb",GZIP_LEVEL)
+  if fmt=="bgzip":
+    return BGZFWriter(open(filename,"wb"),threads)
+  if fmt=="zstd":
+    return ZstdWriter(open(filename,"wb"),threads)
+  raise ValueError("unknown output format %s" % fmt)
@@ -30,29 +30,43 @@
 ###########################
 import subprocess
 import argparse
-from itertools import islice
+from itertools import chain, islice
 import gzip, re, os, math, sys
 import copy
 import datetime
 import numpy as np
+import json, hashlib
+from array import array
+from multiprocessing import Pool
+import arrowIO
+import compressedIO
+import kinshipGraph
+import phenoStore
 
 ###########################
 ##### PARSE ARGUMENTS ####
 ###########################
 def get_settings():
   parser = argparse.ArgumentParser(description='''Script to perform proxy-case assignment using kinship matrix from KING2, self reported affected relative status of mother, father, sibling, and case/control status from EHR derived phenotypes. The default is an output of the phenotype file with an additional column holding the proxy-case assignment.''')
-  parser.add_argument("-k", "--kinship", help="Kinship from KING2 and requires header. Assumes FID1, ID1, FID2, ID2 and additional columns may vary.", type=str)
-  parser.add_argument("-ck","--columnKin",help="0-based column number with Kinship value from KING.",default=8,type=int)
+  parser.add_argument("-k", "--kinship", help="Kinship from KING2 and requires header. Assumes FID1, ID1, FID2, ID2 and additional columns may vary. A Parquet or Arrow table is read one batch of the ID1, ID2 and Kinship columns at a time.", type=str)
+  parser.add_argument("-ck","--columnKin",help="0-based column number with Kinship value from KING [default=column named Kinship in header]",type=int)
+  parser.add_argument("-t","--threads",help="Number of processes used to parse the kinship file and run permutations. Plain text and bgzip files are split into chunks, gzip and zstd files are parsed by one process while another thread decompresses them. Also the number of threads compressing output files with --compress [default=1]",type=int,default=1)
+  parser.add_argument("-kc","--kinCache",help="Directory in which to cache the parsed kinship graph. Reused while the kinship file, its size and modification time, --columnKin and the samples kept are unchanged",type=str)
   parser.add_argument("-p", "--pheno",help="Tab delimited phenotype file. First column must be an ID specific to the individual sample (e.g. IID) that matches kinship file.",type=str,required=True)
   parser.add_argument("-cp","--columnPhenotype",help="0-based column number for phenotype information. Expects 1 for case, 0 for control, NA for missing [default=12]",type=int,default=12)
   parser.add_argument("-cpi","--columnPhenotypeID",help="0-based column number for ID that matches kinship file and GRS file [default=0]",default=0,type=int)
   parser.add_argument("-d","--header",help="Header",action='store_true')
   parser.add_argument("-o","--output",help="Output file name prefix",type=str,required=True)
+  parser.add_argument("-z","--compress",help="Compress every output file with bgzip (gz) or zstd (zst), adding .gz or .zst to the file names. Input files are read plain or compressed either way",choices=["gz","zst"])
   #parser.add_argument("-cm","--columnMother",help="0-based column number for affected mother. Expects 1 if mother is affected and 0 otherwise.", type=int,required=True)
   #parser.add_argument("-cf","--columnFather",help="0-based column number for affected father. Expects 1 if father is affected and 0 otherwise.", type=int,required=True)
   #parser.add_argument("-cs","--columnSibling",help="0-based column number for affected sibling. Expects 1 if sibling is affected and 0 otherwise.", type=int,required=True)
-  parser.add_argument("-g","--GRS",help="File with ID that matches kinship file and GRS",type=str)
-  parser.add_argument("-cg","--columnGRS",help="0-based column number for GRS in -g file",type=int)
+  parser.add_argument("-g","--GRS",help="File with ID that matches kinship file and GRS. A Parquet or Arrow table is read with only the ID and score columns",type=str)
+  parser.add_argument("-cg","--columnGRS",help="0-based column number(s) for GRS in -g file, a list and/or range such as 2,4-9, or all for every numeric column. A first line without any numeric score is read as a header naming the scores",type=str)
+  parser.add_argument("-np","--permutations",help="Number of permutations of GRS over samples used to give empirical p-values for the top 5th percentile enrichment of each index and of the cohort [default=0, no permutation test]",type=int,default=0)
+  parser.add_argument("-ps","--permStrata",help="0-based column in -g file with strata (e.g. batch), GRS are only permuted among samples of the same stratum",type=int)
+  parser.add_argument("-s","--seed",help="Seed for permutations, results do not depend on --threads [default=1]",type=int,default=1)
+  parser.add_argument("-gs","--GRSsidecar",help="Keep the GRS matrix in a binary sidecar directory next to the -g file, memory-mapped and reused while the file and --columnGRS are unchanged",action="store_true")
                       
   args = parser.parse_args()
   print >> sys.stderr, "%s\n" % args
@@ -63,46 +77,6 @@ def get_settings():
 ######### FUNCTIONS ########
 ############################
 
-
-#open file taking zipped or unzipped into account
-def openFile(filename):
-  if ".gz" in filename:
-    command=gzip.open(filename,"rt")
-    print >> sys.stderr, "Opening zipped file\n"
-  elif ".gz" not in filename:
-    command=open(filename,"rt")
-    print >> sys.stderr, "Opening unzipped file\n"
-  return command
-
-
-#these numbers are from http://people.virginia.edu/~wc9c/KING/manual.html
-def is_first_degree_relative(kinship):
-  return (float(kinship) >= 0.177 and float(kinship) <= 0.354)
-
-
-# read kinship file, assumes FID and IID are equal because no family info
-def readKinship(file,col):
-  kinDict = {}  # intialize
-  openCommand=openFile(file) #handle zipped file
-  with openCommand as f:
-    next(f)  # skip header
-    for line in f:
-      line = line.rstrip()
-      lineList = line.split("\t")
-      IID1=lineList[1]
-      IID2=lineList[3]
-      KinVal=lineList[col]
-      if is_first_degree_relative(KinVal): #record first degree relatives only
-        if IID1 not in kinDict.keys():
-          kinDict[IID1] = []  # initalize
-        kinDict[IID1].append(IID2) #make a list of first degree relative IDs
-        if IID2 not in kinDict.keys():
-          kinDict[IID2]=[] #initialize
-        kinDict[IID2].append(IID1)
-        #any ID that is listed in kinship file as ID1  or ID2 will get its own entry in the kinship dictionary
-  f.close()
-  return kinDict
-
 #read phenotype file with case/control information for sample and affected status of relatives
 def readPheno(file,header_bool,phenoID):
   phenoDict = {}  # initialize
@@ -112,7 +86,7 @@ def readPheno(file,header_bool,phenoID):
   else:
     count=1
     header=""
-  f = open(file, "r")
+  f = compressedIO.openInput(file)
   for line in f:
     line = line.rstrip()
     if count==0:
@@ -127,11 +101,11 @@ def readPheno(file,header_bool,phenoID):
   return phenoDict,totalCol,header
 
 #Perform proxy case assignment using information on case/control status of the sample and the kinship matrix with the rest of samples in the study
-def proxy_via_kinship(pd, kd, tc, cp):
+def proxy_via_kinship(pd, kg, tc, cp):
   for sample in pd: #for every sample in phenotype file
-    if sample in kd: #if sample is in kinship dictionary
+    if sample in kg: #if sample is in kinship graph
       flag=False
-      for relative in kd[sample]: #for all listed relatives
+      for relative in kg.relatives(sample,kinshipGraph.DEGREE_FIRST): #for all first degree relatives
         if relative in pd: #if relative is in phenotype file
           if pd[relative][cp]=="1": #if relative is a case
             pd[sample].append("1") #assign positive family history
@@ -142,63 +116,293 @@ def proxy_via_kinship(pd, kd, tc, cp):
     else: #if sample is not in kinship dictionary
       pd[sample].append("0") #assign negatie family history
 
-##figure out which samples are in the top 5th percentile, return list of those IDS
-def percentiles(gd):
-  grs_list=[]
-  for sample in gd.keys():
-    grs_list.append(np.float(gd[sample]))
-  p=np.percentile(grs_list,95) #top 5th precentile 
-  top_list=[]
-  for sample in gd.keys():
-    if np.float(gd[sample]) > p:
-      top_list.append(sample) #record which samples are in the top 5th percentile
-  return(top_list)
-  
-def match_grs(grs,col,kinDict,out):
-  f = open(grs, "r") #open GRS file 
-  grsDict={}
-  for line in f: #read GRS file into dictionary
-    ls = line.rstrip()
-    ll=ls.split("\t")
-    grsDict[ll[0]]=ll[col]
-  top_list=percentiles(grsDict) #get top 5th percentile samples from grs Dict
-  o=open(".".join([out,"GRS.txt"]),"w") #open output file
-  o2=open(".".join([out,"top5.txt"]),"w") #open output file 2
-  o2.write("\t".join(["sample","top5","fracReltop5","numRel","scoreRel"])) #write header
-  o2.write("\n")
-  for index in kinDict.keys(): #choose the index relative
-    sample_list=[]
-    score_list=[]
-    sample_list.append(index)
-    if index in grsDict.keys():
-      score_list.append(float(grsDict[index]))
+BLOCK_LINES=100000 #output lines joined per write
+
+GRS_VERSION=1 #bump when the sidecar layout changes so old sidecars are rebuilt
+GRS_MISSING=("","NA","nan","NaN","-9") #missing scores, read as NaN
+
+#True if a string is a number
+def isNumber(x):
+  try:
+    float(x)
+    return True
+  except ValueError:
+    return False
+
+#float of a string, NaN if it is not a number
+def toFloat(x):
+  try:
+    return float(x)
+  except ValueError:
+    return np.nan
+
+#read score columns of the GRS file into sample IDs, score names and a samples x scores float32 matrix, NaN if a score is not a number
+#cols is a list of 0-based columns, or None for every column after the ID that is numeric or missing on the first data line
+#only the columns up to the last score column are split from each line
+#a sample ID seen twice keeps its last line, as the dictionary this replaces did
+def readGRS(grs,cols=None):
+  if compressedIO.fileFormat(grs) in arrowIO.FORMATS:
+    return readArrowGRS(grs,cols)
+  f = compressedIO.openInput(grs) #open GRS file 
+  first=f.readline().rstrip().split("\t")
+  fields=first[1:] if cols is None else [first[c] for c in cols]
+  header=not any(isNumber(x) for x in fields) and not all(x in GRS_MISSING for x in fields) #no numeric score, so labels
+  pending=[] if header else [first]
+  if cols is None:
+    row=first
+    if header:
+      row=f.readline().rstrip().split("\t")
+      pending=[row]
+    cols=[c for c in range(1,len(row)) if isNumber(row[c]) or row[c] in GRS_MISSING]
+  names=[first[c] if header and first[c] else "col%d" % c for c in cols]
+  last=max(cols)+1
+  ids=[]
+  idIndex={}
+  columns=[array("f") for c in cols]
+  for ll in chain(pending,(line.rstrip().split("\t",last) for line in f)):
+    i=idIndex.get(ll[0])
+    if i is None:
+      idIndex[ll[0]]=len(ids)
+      ids.append(ll[0])
+      for column,c in zip(columns,cols):
+        column.append(toFloat(ll[c]))
     else:
-      score_list.append(np.nan)
-    for relative in kinDict[index]: #for relatives in the list corresponding to the index variant 
-        sample_list.append(relative)
-        if relative in grsDict.keys():
-          score_list.append(float(grsDict[relative]))
-        else:
-          score_list.append(np.nan)
-    mean=np.mean(np.array(score_list[1:])) #calculate mean GRS for all relatives of the index
-    o.write("\t".join([",".join(str(x) for x in score_list),",".join(sample_list),str(score_list[0]),str(mean)])) #1st value of each list is the index
-    o.write("\n")
-    
-    ##number of relatives in top 5 for index in top 5
-    total_relatives=len(sample_list)
-    top_relatives=sum(rel in sample_list for rel in top_list)
-    #print(score_list)
-    if index in top_list:
-      o2.write("\t".join([index,"1",str(np.float(top_relatives)/np.float(total_relatives)),str(total_relatives),",".join(map(str,score_list))]))
-      o2.write("\n")
+      for column,c in zip(columns,cols):
+        column[i]=toFloat(ll[c])
+  f.close()
+  scores=np.column_stack([np.frombuffer(column,dtype=np.float32) for column in columns]) if ids else np.zeros((0,len(cols)),dtype=np.float32)
+  return ids,names,scores
+
+#read the ID column and score columns of a Parquet or Arrow GRS file, cols None is every numeric column after the ID
+#scores are named by their column names and a sample ID seen twice keeps its last row, as for text files
+def readArrowGRS(grs,cols=None):
+  header=arrowIO.columnNames(grs)
+  if cols is None:
+    cols=[c for c in arrowIO.numericColumns(grs) if c > 0]
+  names=[header[c] or "col%d" % c for c in cols]
+  rowIDs=[]
+  blocks=[]
+  for batch in arrowIO.readBatches(grs,[0]+cols):
+    rowIDs.extend(arrowIO.strings(batch[0]))
+    blocks.append(np.column_stack([arrowIO.floats(arr) for arr in batch[1:]]).astype(np.float32))
+  ids=[]
+  idIndex={}
+  rows=[] #row of the file holding each sample
+  for r,sample in enumerate(rowIDs):
+    i=idIndex.get(sample)
+    if i is None:
+      idIndex[sample]=len(ids)
+      ids.append(sample)
+      rows.append(r)
     else:
-      o2.write("\t".join([index,"0",str(np.float(top_relatives)/np.float(total_relatives)),str(total_relatives),",".join(map(str,score_list))]))
-      o2.write("\n")
-    
-  o.close()
-  o2.close()
+      rows[i]=r
+  scores=np.concatenate(blocks)[rows] if ids else np.zeros((0,len(cols)),dtype=np.float32)
+  return ids,names,scores
+
+#read GRS matrix, through a binary sidecar directory next to the GRS file when sidecar is True
+#the sidecar is reused while the file's size and modification time and the columns asked for are unchanged, scores are memory-mapped
+def loadGRS(grs,cols=None,sidecar=False):
+  if not sidecar:
+    return readGRS(grs,cols)
+  path=os.path.abspath(grs)
+  stat=os.stat(path)
+  meta={"version":GRS_VERSION,"path":path,"size":stat.st_size,"mtime":stat.st_mtime,"cols":cols}
+  directory=".".join([path,hashlib.sha1(json.dumps(cols)).hexdigest()[:16],"grs"])
+  if kinshipGraph.readMeta(directory)==meta:
+    print >> sys.stderr, "Loading GRS from sidecar %s\n" % directory
+    return np.load(os.path.join(directory,"ids.npy")).tolist(),np.load(os.path.join(directory,"names.npy")).tolist(),np.load(os.path.join(directory,"scores.npy"),mmap_mode="r")
+  ids,names,scores=readGRS(grs,cols)
+  kinshipGraph.saveArrays(directory,{"ids":kinshipGraph.stringArray(ids),"names":kinshipGraph.stringArray(names),"scores":scores},meta)
+  print >> sys.stderr, "Saved GRS to sidecar %s\n" % directory
+  return ids,names,scores
+
+#GRS strings as printed, shortest float32 representation
+def format_scores(scores):
+  return [str(x) for x in np.asarray(scores,dtype=np.float32)]
+
+#strings of relative GRS means, summed in float64 from the float32 scores and printed to the 7 significant digits float32 holds
+def format_means(values):
+  return ["%.7g" % x for x in values.tolist()]
+
+##figure out which samples are in the top 5th percentile of each score, return boolean matrix parallel to scores
+def percentiles(scores):
+  p=np.nanpercentile(scores,95,axis=0) #top 5th precentile 
+  with np.errstate(invalid="ignore"):
+    return scores > p #record which samples are in the top 5th percentile
+
+#rows of a samples x scores matrix of the GRS file placed at the integer index of every sample in the kinship graph, fill for samples without a GRS
+def graph_values(kg,ids,values,fill):
+  out=np.full((len(kg),values.shape[1]),fill,dtype=values.dtype)
+  index=np.array([kg.idIndex.get(sample,-1) for sample in ids],dtype=np.int64)
+  found=index>=0
+  out[index[found]]=values[found]
+  return out
+
+#write lines to an open file in blocks
+def write_lines(f,lines):
+  for start in range(0,len(lines),BLOCK_LINES):
+    f.write("".join(lines[start:start+BLOCK_LINES]))
+
+#write GRS of every index sample and its first degree relatives (out.GRS.txt) and their top 5th percentile enrichment (out.top5.txt)
+#GRS.txt columns are GRS of index and relatives, IDs of index and relatives, GRS of index, mean and max GRS of the relatives with a GRS,
+#number of relatives and number of relatives with a GRS. Relatives without a GRS are skipped by the mean rather than making it NaN
+#with several scores the files are out.<score>.GRS.txt and out.<score>.top5.txt, the statistics of all scores come from one pass over the graph
+def match_grs(ids,names,scores,kg,out,compress=None,threads=1):
+  isTop=graph_values(kg,ids,percentiles(scores),False) #top 5th percentile samples by kinship graph index
+  score=graph_values(kg,ids,scores,np.nan) #GRS by kinship graph index
+  indptr,indices=kg.csr(kinshipGraph.DEGREE_FIRST)
+
+  ##number of relatives in top 5 (index included) from one product of the adjacency matrix with the top 5 indicators
+  total_relatives=np.diff(indptr)+1
+  top_relatives=kg.relativeCounts(isTop,kinshipGraph.DEGREE_FIRST)+isTop
+  fracTop=top_relatives.astype(np.float64)/total_relatives[:,None]
 
-  return grsDict
+  #mean and max GRS over the relatives of the index with a GRS, number of relatives and number of relatives with a GRS
+  numRel,numGRS,mean,maximum=kg.relativeStats(score,kinshipGraph.DEGREE_FIRST)
+
+  rel=indices.tolist()
+  bounds=indptr.tolist()
+  members=[[i]+rel[bounds[i]:bounds[i+1]] for i in range(len(kg))] #index then first degree relatives of the index sample
+  memberIDs=[",".join([kg.ids[j] for j in m]) for m in members]
+  for k,name in enumerate(names):
+    prefix=out if len(names)==1 else ".".join([out,name])
+    scoreStr=format_scores(score[:,k])
+    meanStr=format_means(mean[:,k])
+    maxStr=format_scores(maximum[:,k]) #the max is one of the scores
+    grsLines=[]
+    topLines=["\t".join(["sample","top5","fracReltop5","numRel","scoreRel"])+"\n"] #header
+    stats=zip(numRel.tolist(),numGRS[:,k].tolist(),isTop[:,k].tolist(),fracTop[:,k].tolist(),total_relatives.tolist())
+    for i,(index,(nr,ng,top,frac,total)) in enumerate(zip(kg.ids,stats)): #choose the index relative
+      scoreList=",".join([scoreStr[j] for j in members[i]])
+      grsLines.append("\t".join([scoreList,memberIDs[i],scoreStr[i],meanStr[i],maxStr[i],str(nr),str(ng)])+"\n") #1st value of each list is the index
+      topLines.append("\t".join([index,"1" if top else "0",str(frac),str(total),scoreList])+"\n")
+
+    o=compressedIO.openOutput(compressedIO.compressedName(".".join([prefix,"GRS.txt"]),compress),threads) #open output file
+    write_lines(o,grsLines)
+    o.close()
+    o2=compressedIO.openOutput(compressedIO.compressedName(".".join([prefix,"top5.txt"]),compress),threads) #open output file 2
+    write_lines(o2,topLines)
+    o2.close()
+
+PERM_COLUMNS=32 #permutation x score columns per sparse product and per work unit, bounds the dense samples x columns matrices of a batch
+
+#read strata column of the GRS file (text, Parquet or Arrow) for the samples in ids, returns list of index arrays into ids, one per stratum
+#a sample ID seen twice keeps its last line, lines of IDs not in ids (such as a header) are skipped
+def readStrata(grs,col,ids):
+  idIndex=dict((sample,i) for i,sample in enumerate(ids))
+  strata=[""]*len(ids)
+  if compressedIO.fileFormat(grs) in arrowIO.FORMATS:
+    f=None
+    rows=zip(*arrowIO.readColumns(grs,[0,col])) #only the ID and strata columns are read
+  else:
+    f = compressedIO.openInput(grs)
+    rows=(line.rstrip().split("\t",col+1) for line in f)
+  for ll in rows:
+    i=idIndex.get(ll[0])
+    if i is not None:
+      strata[i]=ll[col if f is not None else 1]
+  if f is not None:
+    f.close()
+  groups={}
+  for i,x in enumerate(strata):
+    groups.setdefault(x,[]).append(i)
+  return [np.array(groups[x],dtype=np.int64) for x in sorted(groups)]
+
+#settings shared by all permutation batches, set once per worker process
+_permSettings={}
+
+def initPermWorker(kg,gindex,top,strata,observed,seed):
+  n,nscore=observed.shape
+  flags=np.zeros((n,permBatchSize(nscore)*nscore),dtype=bool) #top 5th percentile indicators of a batch, reused by every batch
+  _permSettings.update(kg=kg,gindex=gindex,top=top,strata=strata,observed=observed,seed=seed,flags=flags)
+
+#permutations per batch, PERM_COLUMNS divided by the number of scores and at least one
+def permBatchSize(nscore):
+  return max(1,PERM_COLUMNS//max(1,nscore))
+
+#GRS sample positions shuffled within each stratum
+def permute(rng,strata,n):
+  order=np.arange(n)
+  for group in strata:
+    order[group]=group[rng.permutation(len(group))]
+  return order
+
+#run one batch of permutations, every batch has its own random stream seeded by (seed, first permutation) so results do not depend on the worker
+#returns per index and score the number of permutations with at least the observed top 5th percentile relatives,
+#and per permutation and score the number of first degree pairs with both samples in the top 5th percentile
+def permBatch(job):
+  start,size=job
+  settings=_permSettings
+  kg=settings["kg"]
+  gindex=settings["gindex"] #graph index of each GRS sample, -1 if not in graph
+  top=settings["top"] #GRS samples x scores top 5th percentile indicators
+  observed=settings["observed"] #graph samples x scores observed top 5th percentile relatives, index included
+  n,nscore=observed.shape
+  rng=np.random.RandomState([settings["seed"],start])
+  inGraph=gindex>=0
+  flags=settings["flags"][:,:size*nscore] #samples not in the graph stay False, the others are overwritten by every permutation
+  for b in range(size):
+    permTop=top[permute(rng,settings["strata"],len(gindex))] #GRS labels shuffled over samples
+    flags[gindex[inGraph],b*nscore:(b+1)*nscore]=permTop[inGraph]
+  relTop=kg.relativeCounts(flags,kinshipGraph.DEGREE_FIRST)
+  pairs=(relTop*flags).sum(axis=0).reshape(size,nscore)//2
+  relTop+=flags #index included
+  exceed=(relTop.reshape(n,size,nscore)>=observed[:,None,:]).sum(axis=1)
+  return exceed,pairs
+
+#permutation test of top 5th percentile enrichment in families, GRS are shuffled over the samples of the GRS file (within strata)
+#writes out.perm.txt (out.<score>.perm.txt with several scores) with the empirical p-value of every index and out.perm.summary.txt for the cohort
+def permutation_test(ids,names,scores,strata,kg,out,nperm,threads=1,seed=1,compress=None):
+  top=percentiles(scores)
+  gindex=np.array([kg.idIndex.get(sample,-1) for sample in ids],dtype=np.int64)
+  isTop=graph_values(kg,ids,top,False)
+  relTop=kg.relativeCounts(isTop,kinshipGraph.DEGREE_FIRST)
+  observed=relTop+isTop
+  observedPairs=(relTop*isTop).sum(axis=0)//2
+  if strata is None:
+    strata=[np.arange(len(ids))]
+
+  batch=permBatchSize(len(names))
+  jobs=[(start,min(batch,nperm-start)) for start in range(0,nperm,batch)]
+  exceed=np.zeros(observed.shape,dtype=np.int64)
+  pairs=[]
+  pool=None
+  if threads > 1:
+    pool=Pool(threads,initPermWorker,(kg,gindex,top,strata,observed,seed))
+    batches=pool.imap(permBatch,jobs) #results come back in permutation order
+  else:
+    initPermWorker(kg,gindex,top,strata,observed,seed)
+    batches=(permBatch(job) for job in jobs)
+  try:
+    for batchExceed,batchPairs in batches:
+      exceed+=batchExceed
+      pairs.append(batchPairs)
+    if pool is not None:
+      pool.close()
+      pool.join()
+  finally:
+    if pool is not None:
+      pool.terminate() #workers are stopped if a batch raises
+  pairs=np.concatenate(pairs)
+  pValue=(exceed+1.0)/(nperm+1)
+  pairP=((pairs>=observedPairs).sum(axis=0)+1.0)/(nperm+1)
+
+  indptr,indices=kg.csr(kinshipGraph.DEGREE_FIRST)
+  total_relatives=np.diff(indptr)+1
+  for k,name in enumerate(names):
+    prefix=out if len(names)==1 else ".".join([out,name])
+    lines=["\t".join(["sample","top5","topRel","fracReltop5","empiricalP"])+"\n"] #header
+    for index,t,r,total,pv in zip(kg.ids,isTop[:,k].tolist(),observed[:,k].tolist(),total_relatives.tolist(),pValue[:,k].tolist()):
+      lines.append("\t".join([index,"1" if t else "0",str(r),str(float(r)/total),str(pv)])+"\n")
+    o=compressedIO.openOutput(compressedIO.compressedName(".".join([prefix,"perm.txt"]),compress),threads)
+    write_lines(o,lines)
+    o.close()
+
+  o=compressedIO.openOutput(compressedIO.compressedName(".".join([out,"perm.summary.txt"]),compress),threads)
+  o.write("\t".join(["score","topPairs","meanPermTopPairs","permutations","empiricalP"])+"\n")
+  for k,name in enumerate(names):
+    o.write("\t".join([name,str(observedPairs[k]),str(pairs[:,k].mean()),str(nperm),str(pairP[k])])+"\n")
+  o.close()
 
 #########################
 ########## MAIN #########
@@ -210,7 +414,7 @@ def main():
   phenoDict, totalCol, header = readPheno(args.pheno,args.header,args.columnPhenotypeID)  # read self report file
   print >> sys.stderr, "Finished reading phenotype file %s at %s\n" % (args.pheno, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
   
-  kinDict = readKinship(args.kinship,args.columnKin)  # read kinship file
+  kinDict = kinshipGraph.loadKinship(args.kinship,args.columnKin,threads=args.threads,cacheDir=args.kinCache)  # read kinship file into graph of first degree relatives
   print >> sys.stderr, "Finished reading kinship file %s\n" %args.kinship
   
   cp=args.columnPhenotype
@@ -218,8 +422,18 @@ def main():
   #  cf=args.columnFather
   #  cs=args.columnSibling
 
+  grsNames=[]
+  grsDict={}
   if args.GRS and args.columnGRS:
-    grsDict=match_grs(args.GRS,args.columnGRS,kinDict,args.output)
+    grsIDs,grsNames,grsScores=loadGRS(args.GRS,None if args.columnGRS=="all" else phenoStore.parse_columns(args.columnGRS),args.GRSsidecar)
+    match_grs(grsIDs,grsNames,grsScores,kinDict,args.output,args.compress,args.threads)
+    grsDict=dict((sample,i) for i,sample in enumerate(grsIDs))
+
+    if args.permutations > 0:
+      print >> sys.stderr, "Running %d permutations of GRS at %s\n" % (args.permutations, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+      strata=readStrata(args.GRS,args.permStrata,grsIDs) if args.permStrata is not None else None
+      permutation_test(grsIDs,grsNames,grsScores,strata,kinDict,args.output,args.permutations,args.threads,args.seed,args.compress)
+      print >> sys.stderr, "Finished permutations at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
     print >> sys.stderr, "Listing GRS per index sample\n"
          
@@ -230,17 +444,19 @@ def main():
 
   print >> sys.stderr, "Finished assigning proxy-case based on kinship at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
-  f=open(".".join([args.output,"pheno.txt"]),"w")
+  f=compressedIO.openOutput(compressedIO.compressedName(".".join([args.output,"pheno.txt"]),args.compress),args.threads)
   if args.header==True:
     header_list=header.split("\t")
     header_list.append("InferredFamHx") #add new column label to header
-    header_list.append("GRS") #add new column label to header
+    header_list.extend(["GRS"] if len(grsNames)==1 else ["GRS_"+x for x in grsNames]) #add new column label to header
     f.write("\t".join(header_list))
     f.write("\n")
     for sample in phenoDict:
       f.write("\t".join(phenoDict[sample]))
-      f.write("\t")
-      f.write(str(grsDict[sample]))
+      if grsNames:
+        i=grsDict.get(sample)
+        f.write("\t")
+        f.write("\t".join(format_scores(grsScores[i]) if i is not None else ["NA"]*len(grsNames))) #NA if sample has no GRS
       f.write("\n")
     f.close()
     print >> sys.stderr, "Finished printing results at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -0,0 +1,561 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Shared kinship graph used by proxyCaseAssign1dr.py, proxyCaseAssignAffRel.py and famHxFinder.py.
+# Sample IDs are mapped to dense integers and undirected relative pairs are stored as CSR arrays
+# (indptr/indices) with a float32 kinship value and an int8 degree code per edge.
+# Families are the connected components of the first degree edges, each an independent unit of proxy-case assignment.
+############################
+##### IMPORT MODULES #######
+###########################
+import hashlib, json, os, shutil, struct, sys, tempfile, zlib
+from array import array
+from itertools import islice
+from multiprocessing import Pool
+import numpy as np
+import arrowIO
+import compressedIO
+try:
+  import scipy.sparse as sparse #optional, relative counts fall back to a NumPy CSR kernel without it
+except ImportError:
+  sparse=None
+
+############################
+######### FUNCTIONS ########
+############################
+
+#these numbers are from http://people.virginia.edu/~wc9c/KING/manual.html
+FIRST_DEGREE_MIN=0.177
+FIRST_DEGREE_MAX=0.354
+
+#degree codes stored per edge
+DEGREE_DUPLICATE=0 #duplicate or MZ twin, kinship > 0.354
+DEGREE_FIRST=1 #0.177 <= kinship <= 0.354
+DEGREE_SECOND=2 #0.0884 <= kinship < 0.177
+DEGREE_THIRD=3 #0.0442 <= kinship < 0.0884
+DEGREE_UNRELATED=4 #kinship < 0.0442
+DEGREE_BOUNDS=np.array([0.0442,0.0884,FIRST_DEGREE_MIN])
+
+BLOCK_LINES=500000 #kinship lines parsed per block
+CHUNK_BYTES=64*1024*1024 #bytes of plain text per parallel work unit
+BGZF_CHUNK_BYTES=16*1024*1024 #compressed bytes of bgzip per parallel work unit
+CACHE_VERSION=1 #bump when the cache layout changes so old caches are rebuilt
+CACHE_ARRAYS=["indptr","indices","kinship","degree"]
+
+#classify an array of kinship values into int8 degree codes, comparisons are done in float64 before kinship is stored as float32
+def classifyKinship(kin):
+  kin=np.asarray(kin,dtype=np.float64)
+  code=(DEGREE_UNRELATED-np.searchsorted(DEGREE_BOUNDS,kin,side="right")).astype(np.int8)
+  with np.errstate(invalid="ignore"):
+    code[kin > FIRST_DEGREE_MAX]=DEGREE_DUPLICATE
+  code[np.isnan(kin)]=DEGREE_UNRELATED
+  return code
+
+#undirected graph of relatives, row i of the CSR arrays lists the relatives of sample self.ids[i]
+class KinshipGraph(object):
+  def __init__(self,ids,indptr,indices,kinship,degree):
+    self.ids=ids #list of sample IDs, position in list is the integer index
+    self.idIndex=dict((sample,i) for i,sample in enumerate(ids))
+    self.indptr=indptr #int64, length len(ids)+1
+    self.indices=indices #int32, both directions of every edge
+    self.kinship=kinship #float32, parallel to indices
+    self.degree=degree #int8 degree code, parallel to indices
+
+  def __len__(self):
+    return len(self.ids)
+
+  def __contains__(self,sample):
+    return sample in self.idIndex
+
+  #integer indices of the relatives of sample index i, optionally of one degree code only
+  def neighbors(self,i,degree=None):
+    rel=self.indices[self.indptr[i]:self.indptr[i+1]]
+    if degree is not None:
+      rel=rel[self.degree[self.indptr[i]:self.indptr[i+1]]==degree]
+    return rel
+
+  #IDs of the relatives of a sample ID, optionally of one degree code only, empty list if the sample has none
+  def relatives(self,sample,degree=None):
+    i=self.idIndex.get(sample)
+    if i is None:
+      return []
+    return [self.ids[j] for j in self.neighbors(i,degree).tolist()]
+
+  #sample index of every entry of indices, i.e. the row each relative is listed in
+  def rowIndex(self):
+    return np.repeat(np.arange(len(self.ids),dtype=np.int32),np.diff(self.indptr))
+
+  #per sample counts of relatives by degree code, shape (samples, DEGREE_UNRELATED+1)
+  def degreeCounts(self):
+    n=len(self.ids)
+    width=DEGREE_UNRELATED+1
+    return np.bincount(self.rowIndex().astype(np.int64)*width+self.degree,minlength=n*width).reshape(n,width)
+
+  #per sample counts of relatives (optionally of one degree code) by a category of the relative
+  #category is an integer array over samples with values 0..ncat-1, result has shape (samples, ncat)
+  def categoryCounts(self,category,ncat,degree=None):
+    n=len(self.ids)
+    rows=self.rowIndex().astype(np.int64)
+    cols=self.indices
+    if degree is not None:
+      keep=self.degree==degree
+      rows,cols=rows[keep],cols[keep]
+    return np.bincount(rows*ncat+category[cols],minlength=n*ncat).reshape(n,ncat)
+
+  #every undirected edge once as parallel arrays (i, j, kinship) with i < j, optionally of one degree code only
+  def edges(self,degree=None):
+    src=np.repeat(np.arange(len(self.ids),dtype=np.int32),np.diff(self.indptr))
+    keep=src<self.indices
+    if degree is not None:
+      keep&=self.degree==degree
+    return src[keep],self.indices[keep],self.kinship[keep]
+
+  #CSR arrays (indptr, indices) of the relatives of one degree code only, or of all relatives
+  def csr(self,degree=None):
+    if degree is None:
+      return self.indptr,self.indices
+    keep=self.degree==degree
+    indptr=np.zeros(len(self.ids)+1,dtype=np.int64)
+    np.cumsum(np.bincount(self.rowIndex()[keep],minlength=len(self.ids)),out=indptr[1:])
+    return indptr,self.indices[keep]
+
+  #number of relatives (optionally of one degree code) flagged in each column of flags, a samples x columns boolean matrix
+  #this is the adjacency matrix times flags, done with scipy.sparse when available
+  def relativeCounts(self,flags,degree=None):
+    n=len(self.ids)
+    indptr,indices=self.csr(degree)
+    flags=flags.astype(np.int32)
+    if sparse is not None:
+      adjacency=sparse.csr_matrix((np.ones(len(indices),dtype=np.int32),indices,indptr),shape=(n,n))
+      return np.asarray(adjacency.dot(flags))
+    counts=np.zeros((n,flags.shape[1]),dtype=np.int32)
+    rows=np.flatnonzero(np.diff(indptr)) #reduceat needs non-empty rows
+    if len(rows):
+      counts[rows]=np.add.reduceat(flags[indices],indptr[rows],axis=0)
+    return counts
+
+  #per sample summary of a float value over the relatives (optionally of one degree code), NaN values are skipped
+  #values is a sample array or a samples x scores matrix, summed in float64
+  #returns number of relatives, number with a value, and mean and max of the values (NaN if no relative has one)
+  def relativeStats(self,values,degree=None):
+    n=len(self.ids)
+    indptr,indices=self.csr(degree)
+    count=np.diff(indptr)
+    v=values.reshape(n,-1)[indices].astype(np.float64)
+    present=~np.isnan(v)
+    nonMissing=np.zeros((n,v.shape[1]),dtype=np.int64)
+    maximum=np.full((n,v.shape[1]),np.nan)
+    rows=np.flatnonzero(count) #reduceat needs non-empty rows
+    if len(rows):
+      nonMissing[rows]=np.add.reduceat(present.astype(np.int64),indptr[rows],axis=0)
+      maximum[rows]=np.fmax.reduceat(v,indptr[rows],axis=0)
+    #bincount adds the values of a row in order, as np.mean of a short list does, reduceat may round differently
+    row=np.repeat(np.arange(n),count)
+    v[~present]=0.0
+    sums=np.column_stack([np.bincount(row,weights=v[:,k],minlength=n) for k in range(v.shape[1])])
+    with np.errstate(invalid="ignore",divide="ignore"):
+      mean=sums/nonMissing
+    if values.ndim==1:
+      return count,nonMissing[:,0],mean[:,0],maximum[:,0]
+    return count,nonMissing,mean,maximum
+
+  #boolean array, True for samples with at least one relative (optionally of one degree code) for which flag is True
+  def anyRelative(self,flag,degree=None):
+    src,dst,kin=self.edges(degree)
+    found=np.zeros(len(self.ids),dtype=bool)
+    found[src[flag[dst]]]=True
+    found[dst[flag[src]]]=True
+    return found
+
+  #family of every sample, the connected components of the relatives of one degree code (first degree by default, None for all relatives)
+  #families are numbered from 0 in order of their first sample and a sample without relatives is a family of its own
+  #union-find over the edge arrays: every root is pointed at the smallest root it shares an edge with, then paths are compressed
+  def components(self,degree=DEGREE_FIRST):
+    src,dst,kin=self.edges(degree)
+    src=src.astype(np.int64)
+    dst=dst.astype(np.int64)
+    parent=np.arange(len(self.ids),dtype=np.int64)
+    while True:
+      rootSrc,rootDst=parent[src],parent[dst]
+      differ=rootSrc!=rootDst
+      if not differ.any():
+        break
+      hi=np.maximum(rootSrc[differ],rootDst[differ])
+      lo=np.minimum(rootSrc[differ],rootDst[differ])
+      order=np.argsort(hi,kind="mergesort")
+      roots,starts=np.unique(hi[order],return_index=True)
+      parent[roots]=np.minimum.reduceat(lo[order],starts)
+      grand=parent[parent]
+      while (grand!=parent).any():
+        parent=grand
+        grand=parent[parent]
+    return np.unique(parent,return_inverse=True)[1].astype(np.int32)
+
+  #graph of the samples in rows (sorted integer indices) and the edges among them, sample i of the new graph is rows[i]
+  def subgraph(self,rows):
+    rows=np.asarray(rows,dtype=np.int64)
+    position=np.full(len(self.ids),-1,dtype=np.int64)
+    position[rows]=np.arange(len(rows))
+    count=self.indptr[rows+1]-self.indptr[rows]
+    offset=np.zeros(len(rows)+1,dtype=np.int64)
+    np.cumsum(count,out=offset[1:])
+    entries=np.repeat(self.indptr[rows]-offset[:-1],count)+np.arange(offset[-1]) #positions in indices of every relative of rows
+    cols=position[self.indices[entries]]
+    keep=cols>=0
+    indptr=np.zeros(len(rows)+1,dtype=np.int64)
+    np.cumsum(np.bincount(np.repeat(np.arange(len(rows)),count)[keep],minlength=len(rows)),out=indptr[1:])
+    return KinshipGraph([self.ids[i] for i in rows.tolist()],indptr,cols[keep].astype(np.int32),self.kinship[entries[keep]],self.degree[entries[keep]])
+
+#split families (from KinshipGraph.components) into shards with about the same number of samples, a family is never split
+#families are dealt to shards largest first in serpentine order (0..shards-1, then back), returns one sorted array of sample indices per shard
+def familyShards(family,shards):
+  sizes=np.bincount(family)
+  order=np.argsort(-sizes,kind="mergesort")
+  turn=np.arange(len(order))
+  dealt=turn%shards
+  dealt=np.where((turn//shards)%2==0,dealt,shards-1-dealt)
+  shardOf=np.zeros(len(sizes),dtype=np.int64)
+  shardOf[order]=dealt
+  sampleShard=shardOf[family]
+  byShard=np.argsort(sampleShard,kind="mergesort") #sample indices stay sorted within a shard
+  bounds=np.searchsorted(sampleShard[byShard],np.arange(shards+1))
+  return [byShard[bounds[s]:bounds[s+1]] for s in range(shards)]
+
+#build CSR graph from parallel arrays of integer sample indices, kinship values and degree codes
+#pairs listed more than once (in either order) are kept once and self pairs are dropped
+def buildGraph(ids,src,dst,kin,degree=None):
+  n=len(ids)
+  if degree is None:
+    degree=classifyKinship(kin)
+  src=np.asarray(src,dtype=np.int64)
+  dst=np.asarray(dst,dtype=np.int64)
+  kin=np.asarray(kin,dtype=np.float32)
+  degree=np.asarray(degree,dtype=np.int8)
+  keep=src!=dst
+  lo=np.minimum(src[keep],dst[keep])
+  hi=np.maximum(src[keep],dst[keep])
+  kin=kin[keep]
+  degree=degree[keep]
+  pairKey,first=np.unique(lo*n+hi,return_index=True)
+  lo,hi,kin,degree=lo[first],hi[first],kin[first],degree[first]
+
+  #store both directions so each row holds all relatives of a sample
+  rows=np.concatenate([lo,hi])
+  cols=np.concatenate([hi,lo])
+  order=np.lexsort((cols,rows))
+  indptr=np.zeros(n+1,dtype=np.int64)
+  np.cumsum(np.bincount(rows,minlength=n),out=indptr[1:])
+  return KinshipGraph(ids,indptr,cols[order].astype(np.int32),np.concatenate([kin,kin])[order],np.concatenate([degree,degree])[order])
+
+#find 0-based ID1, ID2 and kinship columns from KING header (.kin0 is FID1 ID1 FID2 ID2 ... Kinship, .kin is FID ID1 ID2 ... Kinship)
+#col overrides the kinship column, columns not named in the header fall back to the .kin0 layout
+def kinColumns(header,col=None):
+  header_list=header.rstrip().split("\t")
+  def find(names,default):
+    for name in names:
+      if name in header_list:
+        return header_list.index(name)
+    return default
+  id1=find(["ID1","IID1"],1)
+  id2=find(["ID2","IID2"],3)
+  if col is None:
+    col=find(["Kinship"],7)
+  return id1,id2,col
+
+#parse a block of kinship lines, only split as far as the columns we need
+#returns ID1 and ID2 lists, kinship and degree code arrays of rows whose degree code is True in keepDegree
+#and, if keepIDs is given, whose IDs are both in keepIDs
+def parseLines(lines,id1,id2,col,keepDegree,keepIDs=None):
+  last=max(id1,id2,col)
+  rows=[line.rstrip("\r\n").split("\t",last+1) for line in lines]
+  blockKin=np.array([row[col] for row in rows],dtype=np.float64)
+  blockCode=classifyKinship(blockKin)
+  IDs1=[]
+  IDs2=[]
+  kept=array("i")
+  for r in np.flatnonzero(keepDegree[blockCode]).tolist(): #most pairs in a .kin0 file are unrelated
+    IID1=rows[r][id1]
+    IID2=rows[r][id2]
+    if keepIDs is not None:
+      if IID1 not in keepIDs or IID2 not in keepIDs:
+        continue
+    IDs1.append(IID1)
+    IDs2.append(IID2)
+    kept.append(r)
+  kept=np.frombuffer(kept,dtype=np.int32)
+  return IDs1,IDs2,blockKin[kept],blockCode[kept]
+
+#same as parseLines for one record batch (ID1, ID2 and kinship arrays) of a Parquet or Arrow file, IDs are only converted for rows kept by degree
+def parseBatch(batch,keepDegree,keepIDs=None):
+  ids1,ids2,kinArray=batch
+  blockKin=arrowIO.floats(kinArray)
+  blockCode=classifyKinship(blockKin)
+  rows=np.flatnonzero(keepDegree[blockCode])
+  IDs1=arrowIO.take(ids1,rows)
+  IDs2=arrowIO.take(ids2,rows)
+  if keepIDs is not None:
+    kept=[r for r,(IID1,IID2) in enumerate(zip(IDs1,IDs2)) if IID1 in keepIDs and IID2 in keepIDs]
+    IDs1=[IDs1[r] for r in kept]
+    IDs2=[IDs2[r] for r in kept]
+    rows=rows[np.asarray(kept,dtype=np.int64)]
+  return IDs1,IDs2,blockKin[rows],blockCode[rows]
+
+#byte ranges of a plain text file after the header line, every range starts and ends on a line boundary
+def plainChunks(filename,chunkBytes=CHUNK_BYTES):
+  size=os.path.getsize(filename)
+  chunks=[]
+  with open(filename,"rb") as f:
+    f.readline() #skip header
+    start=f.tell()
+    while start < size:
+      f.seek(min(start+chunkBytes,size))
+      f.readline() #move to end of the line the boundary falls in
+      end=min(f.tell(),size)
+      chunks.append(("plain",filename,start,end))
+      start=end
+  return chunks
+
+#(offset, size) of every BGZF block, read from the BSIZE field of each block header
+#empty blocks (ISIZE 0) such as the EOF block, also found inside concatenated bgzip files, are left out
+#so the block before a chunk and the blocks after it always hold data
+def bgzfBlocks(filename):
+  blocks=[]
+  size=os.path.getsize(filename)
+  with open(filename,"rb") as f:
+    offset=0
+    while offset < size:
+      f.seek(offset)
+      head=f.read(12)
+      xlen=struct.unpack("<H",head[10:12])[0]
+      extra=f.read(xlen)
+      i=0
+      bsize=None
+      while i < xlen:
+        slen=struct.unpack("<H",extra[i+2:i+4])[0]
+        if extra[i:i+2]=="BC":
+          bsize=struct.unpack("<H",extra[i+4:i+6])[0]
+        i+=4+slen
+      if bsize is None:
+        raise ValueError("%s is not a bgzip file, block at byte %d has no BSIZE" % (filename,offset))
+      f.seek(offset+bsize-3)
+      if struct.unpack("<I",f.read(4))[0] > 0:
+        blocks.append((offset,bsize+1))
+      offset+=bsize+1
+  return blocks
+
+#decompress one BGZF block
+def inflateBlock(f,block):
+  offset,size=block
+  f.seek(offset)
+  data=f.read(size)
+  xlen=struct.unpack("<H",data[10:12])[0]
+  return zlib.decompress(data[12+xlen:size-8],-15)
+
+#groups of consecutive BGZF blocks, each with the block before it and a few blocks after it to find line boundaries
+#a line belongs to the chunk it starts in, so a chunk skips its first partial line and finishes its last one
+def bgzfChunks(filename,chunkBytes=BGZF_CHUNK_BYTES,following=4):
+  blocks=bgzfBlocks(filename)
+  chunks=[]
+  first=0
+  while first < len(blocks):
+    last=first
+    total=0
+    while last < len(blocks) and total < chunkBytes:
+      total+=blocks[last][1]
+      last+=1
+    prev=blocks[first-1] if first > 0 else None
+    chunks.append(("bgzip",filename,blocks[first:last],prev,blocks[last:last+following]))
+    first=last
+  return chunks
+
+#settings shared by all chunks, set once per worker process
+_chunkSettings={}
+
+def initChunkWorker(id1,id2,col,keepDegree,keepIDs):
+  _chunkSettings.update(id1=id1,id2=id2,col=col,keepDegree=keepDegree,keepIDs=keepIDs)
+
+#read and parse one chunk from plainChunks or bgzfChunks in a worker process
+def parseChunk(chunk):
+  if chunk[0]=="plain":
+    kind,filename,start,end=chunk
+    with open(filename,"rb") as f:
+      f.seek(start)
+      data=f.read(end-start)
+  else:
+    kind,filename,blocks,prev,following=chunk
+    with open(filename,"rb") as f:
+      data="".join([inflateBlock(f,block) for block in blocks])
+      #chunk 0 starts with the header, other chunks start with the rest of the previous chunk's last line unless it ended on a block boundary
+      if prev is None or not inflateBlock(f,prev).endswith("\n"):
+        data=data[data.find("\n")+1:] if "\n" in data else ""
+      for block in following:
+        if data.endswith("\n") or not data:
+          break
+        more=inflateBlock(f,block)
+        newline=more.find("\n")
+        if newline >= 0:
+          data+=more[:newline+1]
+          break
+        data+=more
+  lines=data.split("\n")
+  if lines and not lines[-1]:
+    lines.pop() #text after the final newline
+  settings=_chunkSettings
+  return parseLines(lines,settings["id1"],settings["id2"],settings["col"],settings["keepDegree"],settings["keepIDs"])
+
+#write a dict of name to array as one .npy file per array plus meta.json into directory
+#written to a temporary directory first so readers never see a partial cache
+def saveArrays(directory,arrays,meta):
+  parent=os.path.dirname(os.path.abspath(directory))
+  tmp=tempfile.mkdtemp(dir=parent)
+  for name,values in arrays.items():
+    np.save(os.path.join(tmp,name+".npy"),np.ascontiguousarray(values))
+  with open(os.path.join(tmp,"meta.json"),"w") as f:
+    json.dump(meta,f,sort_keys=True)
+  if os.path.isdir(directory):
+    shutil.rmtree(directory)
+  os.rename(tmp,directory)
+
+#metadata of a directory written by saveArrays, None if there is none
+def readMeta(directory):
+  try:
+    with open(os.path.join(directory,"meta.json")) as f:
+      return json.load(f)
+  except (IOError,ValueError):
+    return None
+
+#array of strings as saved by saveArrays, empty lists need an explicit dtype
+def stringArray(values):
+  return np.array(values,dtype=str) if values else np.zeros(0,dtype="S1")
+
+#write graph as one .npy file per array into directory
+def saveGraph(kg,directory,meta):
+  arrays=dict((name,getattr(kg,name)) for name in CACHE_ARRAYS)
+  arrays["ids"]=stringArray(kg.ids)
+  saveArrays(directory,arrays,meta)
+
+#load graph written by saveGraph, the CSR arrays are memory-mapped rather than read
+def loadGraph(directory):
+  ids=np.load(os.path.join(directory,"ids.npy")).tolist()
+  arrays=[np.load(os.path.join(directory,name+".npy"),mmap_mode="r") for name in CACHE_ARRAYS]
+  return KinshipGraph(ids,*arrays)
+
+#cache entry for a kinship file: directory named by the file and the options that change the graph, plus the
+#metadata (including file size and modification time) that must match for the cached graph to be used
+def cacheEntry(cacheDir,file,col,keep,degrees):
+  path=os.path.abspath(file)
+  stat=os.stat(path)
+  keepDigest=hashlib.sha1("\n".join(keep)).hexdigest() if keep is not None else None
+  meta={"version":CACHE_VERSION,"path":path,"size":stat.st_size,"mtime":stat.st_mtime,"col":col,"degrees":sorted(degrees),"keep":keepDigest}
+  key=hashlib.sha1(json.dumps([path,col,sorted(degrees),keepDigest],sort_keys=True)).hexdigest()[:16]
+  return os.path.join(cacheDir,".".join([os.path.basename(path),key,"graph"])),meta
+
+#read kinship graph, through an on-disk cache when cacheDir is given so the kinship file is only reparsed when it or the options changed
+def loadKinship(file,col=None,keep=None,degrees=(DEGREE_FIRST,),threads=1,cacheDir=None):
+  if cacheDir is None:
+    return readKinship(file,col,keep,degrees,threads)
+  if keep is not None:
+    keep=list(keep)
+  directory,meta=cacheEntry(cacheDir,file,col,keep,degrees)
+  if readMeta(directory)==meta:
+    print >> sys.stderr, "Loading kinship graph from cache %s\n" % directory
+    return loadGraph(directory)
+  kg=readKinship(file,col,keep,degrees,threads)
+  if not os.path.isdir(cacheDir):
+    os.makedirs(cacheDir)
+  saveGraph(kg,directory,meta)
+  print >> sys.stderr, "Saved kinship graph to cache %s\n" % directory
+  return kg
+
+#parsed blocks of a kinship file in file order, see parseLines
+#Parquet and Arrow files are read one record batch of the ID1, ID2 and kinship columns at a time
+def kinshipBlocks(file,col,keepDegree,keepIDs,threads=1):
+  fmt=compressedIO.fileFormat(file)
+  if fmt in arrowIO.FORMATS:
+    id1,id2,col=kinColumns("\t".join(arrowIO.columnNames(file)),col)
+    for batch in arrowIO.readBatches(file,[id1,id2,col]):
+      yield parseBatch(batch,keepDegree,keepIDs)
+    return
+
+  chunks=None
+  if threads > 1:
+    if fmt=="plain":
+      chunks=plainChunks(file)
+    elif fmt=="bgzip":
+      chunks=bgzfChunks(file)
+    else:
+      print >> sys.stderr, "%s is %s compressed and can not be split, parsing with one process while it is decompressed in another thread\n" % (file,fmt)
+
+  with compressedIO.openInput(file,1 if chunks else threads) as f:
+    id1,id2,col=kinColumns(next(f),col)
+    if chunks:
+      pool=Pool(threads,initChunkWorker,(id1,id2,col,keepDegree,keepIDs))
+      try:
+        for block in pool.imap(parseChunk,chunks): #results come back in file order
+          yield block
+        pool.close()
+        pool.join()
+      finally:
+        pool.terminate() #workers are stopped if a chunk fails to parse or the blocks are not all read
+    else:
+      for block in iter(lambda: list(islice(f,BLOCK_LINES)),[]):
+        yield parseLines(block,id1,id2,col,keepDegree,keepIDs)
+
+# read KING kinship file (text, compressed text, Parquet or Arrow) into a graph in blocks of lines, the kinship column of a block is converted and classified
+# into degree codes with NumPy and only pairs with a code in degrees (first degree by default) are kept
+# if keep is given pairs are also dropped unless both IDs are in keep, and its order defines the integer index of each
+# sample so graph indices line up with the phenotype file
+# with threads > 1 plain text and bgzip files are split into chunks parsed in a process pool, gzip and zstd files can not be split
+def readKinship(file,col=None,keep=None,degrees=(DEGREE_FIRST,),threads=1):
+  ids=[] #integer index to sample ID
+  idIndex={} #sample ID to integer index
+  if keep is not None:
+    for sample in keep:
+      if sample not in idIndex:
+        idIndex[sample]=len(ids)
+        ids.append(sample)
+  keepIDs=frozenset(idIndex) if keep is not None else None
+  keepDegree=np.zeros(DEGREE_UNRELATED+1,dtype=bool)
+  keepDegree[list(degrees)]=True
+  src=array("i")
+  dst=array("i")
+  kin=[]
+  code=[]
+  for IDs1,IDs2,blockKin,blockCode in kinshipBlocks(file,col,keepDegree,keepIDs,threads):
+    for IID1,IID2 in zip(IDs1,IDs2):
+      if keep is None:
+        for ID in (IID1,IID2):
+          if ID not in idIndex:
+            idIndex[ID]=len(ids)
+            ids.append(ID)
+      src.append(idIndex[IID1])
+      dst.append(idIndex[IID2])
+    kin.append(blockKin)
+    code.append(blockCode)
+  kin=np.concatenate(kin) if kin else np.zeros(0)
+  code=np.concatenate(code) if code else np.zeros(0,dtype=np.int8)
+  return buildGraph(ids,np.frombuffer(src,dtype=np.int32),np.frombuffer(dst,dtype=np.int32),kin,code)
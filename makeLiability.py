@@ -0,0 +1,344 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Posterior mean liabilities of the pedigrees written by makePed.py, as makeLiability.R estimates them with a Gibbs sampler
+# of the truncated multivariate normal per family. A family's liabilities only depend on its configuration: pedigree
+# structure and the liability thresholds its members' phenotype, sex and age give. Each distinct configuration is sampled
+# once, with draws seeded from --seed and the configuration, and its result is given to every family that shares it.
+# Configurations of the same structure are sampled together as one batch of NumPy arrays.
+############################
+##### IMPORT MODULES #######
+###########################
+import argparse
+import hashlib, json, os, sys
+import numpy as np
+from scipy.special import ndtr, ndtri
+import compressedIO
+
+###########################
+##### PARSE ARGUMENTS ####
+###########################
+def get_settings():
+  parser=argparse.ArgumentParser(
+  description='''Script to estimate posterior mean liabilities of the pedigrees made by makePed.py, given heritability and prevalence by age and sex. Python version of makeLiability.R that samples every distinct family configuration once''')
+  parser.add_argument("-t","--heritability",help="Estimated heritability of the trait",type=float,required=True)
+  parser.add_argument("-v","--prevalence",help="File with prevalence by age and sex, columns AGE, K_MALE, K_FEMALE, K_MALE_SMOOTH and K_FEMALE_SMOOTH as written by makePrev.R",type=str,required=True)
+  parser.add_argument("-p","--ped",help=".ped file from makePed.py, plain text or gzip, bgzip or zstd compressed",type=str)
+  parser.add_argument("-sg","--signatures",help="Pedigree signature table from makePed.py --signatures, used instead of --ped. Liabilities are estimated once per signature at the age bucket it gives",type=str)
+  parser.add_argument("-o","--output",help="Output file name prefix, liabilities of every pedigree member are printed to <output>.liab",type=str,required=True)
+  parser.add_argument("-f","--phenoFile",help="Phenotype file. If present, will add liabilities of the probands as a new column matching on IID in <output>.liab.phenoFile",type=str)
+  parser.add_argument("-n","--samples",help="Number of Gibbs samples kept per configuration [default=1000]",type=int,default=1000)
+  parser.add_argument("-b","--burnIn",help="Number of Gibbs samples discarded before the first one kept [default=100]",type=int,default=100)
+  parser.add_argument("-th","--thinning",help="Keep every <thinning>th Gibbs sample [default=5]",type=int,default=5)
+  parser.add_argument("-s","--seed",help="Seed of the Gibbs sampler, draws of every configuration are seeded from it and the configuration [default=12345]",type=int,default=12345)
+  parser.add_argument("-lc","--liabCache",help="Directory in which to cache the liabilities of every configuration. Reused by later runs with the same heritability, --samples, --burnIn, --thinning and --seed",type=str)
+  args=parser.parse_args()
+  return args
+
+############################
+######### FUNCTIONS ########
+############################
+
+BATCH=256 #configurations sampled together, bounds the uniform draws held to BATCH x samples x members
+CACHE_VERSION=1 #bump when the sampler changes so old caches are not reused
+SEX_MALE="1"
+SEX_FEMALE="2"
+
+#prevalence table, AGE and the four prevalence columns as arrays
+def readPrevalence(file):
+  f=compressedIO.openInput(file)
+  f.readline() #header
+  rows=[line.split() for line in f if line.strip()]
+  f.close()
+  table=np.array([[float(x) for x in row[:5]] for row in rows])
+  return table[:,0],table[:,1:5]
+
+#age used for the prevalence of a member, as assign_age in makeLiability.R
+#missing age is the median proband age, an age not in the prevalence table is raised a year at a time until it is, then kept in range
+def prevalenceAge(age,ages,medAge):
+  if age is None:
+    age=medAge
+  present=set(ages.tolist())
+  while age <= ages.max() and age not in present:
+    age+=1
+  return min(max(age,ages.min()),ages.max())
+
+#liability thresholds (lower, upper) of a member from phenotype, sex and age as in makeLiability.R
+#cases are above the threshold of the prevalence for their age and sex, controls below it and missing phenotypes are not bounded
+def thresholds(pheno,sex,age,prevalence,medAge):
+  ages,k=prevalence
+  row=np.flatnonzero(ages==prevalenceAge(age,ages,medAge))[0]
+  K=(k[row,0]+k[row,1])/2 #average male and female prevalence
+  if sex==SEX_MALE:
+    K=k[row,2] #male smooth prevalence
+  elif sex==SEX_FEMALE:
+    K=k[row,3] #female smooth prevalence
+  t=ndtri(1-K)
+  if pheno=="1": #case
+    if K==0:
+      raw=k[:,0:2].ravel()
+      t=ndtri(1-raw[raw!=0].min())
+    return (float(t),float("inf"))
+  elif pheno=="0": #control
+    return (float("-inf"),float(t))
+  return (float("-inf"),float("inf"))
+
+#kinship coefficients of a pedigree given the index of every member's father and mother (None if not in the pedigree)
+def kinshipMatrix(fathers,mothers):
+  n=len(fathers)
+  depth=[None]*n
+  def generation(i):
+    if depth[i] is None:
+      depth[i]=1+max([generation(p) for p in (fathers[i],mothers[i]) if p is not None]+[-1])
+    return depth[i]
+  memo={}
+  def phi(a,b):
+    if a is None or b is None:
+      return 0.0
+    if (a,b) in memo:
+      return memo[(a,b)]
+    if a==b:
+      value=0.5*(1+phi(fathers[a],mothers[a]))
+    else:
+      if generation(a) < generation(b): #recurse on the member who can not be an ancestor of the other
+        a,b=b,a
+      value=0.5*(phi(fathers[a],b)+phi(mothers[a],b))
+    memo[(a,b)]=memo[(b,a)]=value
+    return value
+  return np.array([[phi(a,b) for b in range(n)] for a in range(n)])
+
+#configuration of a family from its members' parents, phenotype, sex and age: the structure and the thresholds of every member
+def configuration(fathers,mothers,phenos,sexes,ages,prevalence,medAge):
+  bounds=[thresholds(p,s,a,prevalence,medAge) for p,s,a in zip(phenos,sexes,ages)]
+  return (tuple(fathers),tuple(mothers)),tuple(bounds)
+
+#text key of a configuration, used to seed its draws and in the cache
+def configurationKey(structure,bounds):
+  return ";".join(["%s,%s,%r,%r" % (f,m,lo,hi) for f,m,(lo,hi) in zip(structure[0],structure[1],bounds)])
+
+#posterior mean liabilities of a batch of configurations of one structure, one row per configuration
+#Gibbs sampler of the truncated multivariate normal with covariance h2 x relatedness (1 on the diagonal), every member is drawn
+#from its conditional normal truncated to its thresholds by inverting the normal CDF, on the side of the mean away from the far tail
+def gibbsBatch(structure,bounds,keys,h2,samples,burnIn,thinning,seed):
+  sigma=h2*2*kinshipMatrix(*structure)
+  np.fill_diagonal(sigma,1)
+  precision=np.linalg.inv(sigma)
+  n=len(structure[0])
+  lower=np.array([[lo for lo,hi in b] for b in bounds])
+  upper=np.array([[hi for lo,hi in b] for b in bounds])
+  x=np.clip(np.zeros(lower.shape),lower,upper) #start inside the truncation region
+  sweeps=burnIn+samples*thinning
+  draws=np.array([np.random.RandomState(int(hashlib.md5("%d\t%s" % (seed,key)).hexdigest()[:8],16)).random_sample((sweeps,n)) for key in keys])
+  total=np.zeros(x.shape)
+  sd=1/np.sqrt(np.diag(precision))
+  for sweep in range(sweeps):
+    for i in range(n):
+      mu=x[:,i]-x.dot(precision[i])/precision[i,i]
+      a=(lower[:,i]-mu)/sd[i]
+      b=(upper[:,i]-mu)/sd[i]
+      flip=a > 0 #sample -z in (-b, -a) so the CDF is evaluated in the lower tail
+      lo=np.where(flip,-b,a)
+      hi=np.where(flip,-a,b)
+      pLo=ndtr(lo)
+      pHi=ndtr(hi)
+      with np.errstate(invalid="ignore",divide="ignore"):
+        z=ndtri(pLo+draws[:,sweep,i]*(pHi-pLo))
+      z=np.where(pHi > pLo,z,lo) #region too far in the tail to invert, use its boundary
+      z=np.clip(z,lo,hi)
+      x[:,i]=mu+sd[i]*np.where(flip,-z,z)
+    if sweep >= burnIn and (sweep-burnIn+1)%thinning==0:
+      total+=x
+  return total/samples
+
+#liabilities of every configuration, sampled once each and in batches of the same structure
+#configurations found in cache (key to liabilities) are not sampled again, newly sampled ones are added to it
+def liabilities(configs,h2,samples,burnIn,thinning,seed,cache):
+  results={}
+  todo={}
+  for config in configs:
+    key=configurationKey(*config)
+    if key in cache:
+      results[config]=cache[key]
+    else:
+      todo.setdefault(config[0],[]).append(config)
+  for structure,group in todo.items():
+    for start in range(0,len(group),BATCH):
+      batch=group[start:start+BATCH]
+      keys=[configurationKey(*config) for config in batch]
+      liab=gibbsBatch(structure,[config[1] for config in batch],keys,h2,samples,burnIn,thinning,seed)
+      for config,key,row in zip(batch,keys,liab.tolist()):
+        results[config]=row
+        cache[key]=row
+  return results
+
+#cache file of a directory for the sampler settings, and the key to liabilities it holds
+def cacheFile(cacheDir,h2,samples,burnIn,thinning,seed):
+  settings=json.dumps([CACHE_VERSION,repr(h2),samples,burnIn,thinning,seed])
+  return os.path.join(cacheDir,"liability.%s.txt" % hashlib.sha1(settings).hexdigest()[:16])
+
+def readCache(file):
+  cache={}
+  if os.path.exists(file):
+    with open(file) as f:
+      for line in f:
+        key,values=line.rstrip("\n").split("\t")
+        cache[key]=[float(x) for x in values.split(",")]
+  return cache
+
+#add the configurations not yet in the cache file
+def writeCache(file,cache,known):
+  directory=os.path.dirname(os.path.abspath(file))
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  with open(file,"a") as f:
+    for key,values in cache.items():
+      if key not in known:
+        f.write("%s\t%s\n" % (key,",".join([repr(x) for x in values])))
+
+#families of a .ped file in order of first appearance, each a list of (IID, FATHER, MOTHER, SEX, AGE, PHENO) in file order
+def readPed(file):
+  families={}
+  order=[]
+  f=compressedIO.openInput(file)
+  f.readline() #header
+  for line in f:
+    line_list=line.rstrip().split("\t")
+    if len(line_list) < 7:
+      continue
+    fid,iid,father,mother,sex,age,pheno=line_list[:7]
+    if fid not in families:
+      families[fid]=[]
+      order.append(fid)
+    families[fid].append((iid,father,mother,sex,None if age=="NA" else int(age),pheno))
+  f.close()
+  return [(fid,families[fid]) for fid in order]
+
+#members of a pedigree signature from makePed.py, role to IID suffix, parents are given to probands and siblings
+SIGNATURE_ROLES={"P":"PROBAND","M":"MOTHER","F":"FATHER","S":"SIBLING"}
+
+#pedigree of a signature as members like those of readPed, with IIDs made from fid
+def signatureMembers(key,fid):
+  members=[]
+  roles=[x.split(",") for x in key.split(";")]
+  has=set([role for role,sex,age,pheno in roles])
+  for role,sex,age,pheno in roles:
+    father="_".join([fid,"FATHER"]) if role in "PS" and "F" in has else "NA"
+    mother="_".join([fid,"MOTHER"]) if role in "PS" and "M" in has else "NA"
+    members.append(("_".join([fid,SIGNATURE_ROLES[role]]),father,mother,sex,None if age=="NA" else int(age),pheno))
+  return members
+
+#signature table from makePed.py as (key, FIDs) in file order
+def readSignatures(file):
+  signatures=[]
+  f=compressedIO.openInput(file)
+  f.readline() #header
+  for line in f:
+    line_list=line.rstrip("\n").split("\t")
+    if len(line_list) >= 3:
+      signatures.append((line_list[0],line_list[2].split(",")))
+  f.close()
+  return signatures
+
+#configuration of the members of a pedigree (see readPed)
+def familyConfiguration(members,prevalence,medAge):
+  index=dict((iid,i) for i,(iid,father,mother,sex,age,pheno) in enumerate(members))
+  fathers=[index.get(father) for iid,father,mother,sex,age,pheno in members]
+  mothers=[index.get(mother) for iid,father,mother,sex,age,pheno in members]
+  return configuration(fathers,mothers,[m[5] for m in members],[m[3] for m in members],[m[4] for m in members],prevalence,medAge)
+
+#median proband age of the ped file, as makeLiability.R does for members with missing age
+def medianAge(ages):
+  ages=[x for x in ages if x is not None]
+  return float(np.median(ages)) if ages else 0
+
+#print liabilities of every member (IID and liability, space separated, no header) as makeLiability.R does
+def writeLiabilities(file,rows):
+  f=compressedIO.openOutput(file)
+  for iid,liab in rows:
+    f.write("%s %.15g\n" % (iid,liab))
+  f.close()
+
+#add proband liabilities to the phenotype file as a liab column matched on IID, NA when a sample has no proband
+def writePhenoLiabilities(phenoFile,file,probands):
+  f=compressedIO.openInput(phenoFile)
+  out=compressedIO.openOutput(file)
+  header=f.readline().rstrip("\r\n")
+  iid=header.split("\t").index("IID")
+  print >> out, "\t".join([header,"liab"])
+  for line in f:
+    line=line.rstrip("\r\n")
+    sample=line.split("\t",iid+1)[iid]
+    print >> out, "\t".join([line,"%.15g" % probands[sample] if sample in probands else "NA"])
+  f.close()
+  out.close()
+
+#########################
+########## MAIN #########
+#########################
+
+def main():
+  args=get_settings()
+  if (args.ped is None)==(args.signatures is None):
+    print >> sys.stderr, "Please give either --ped or --signatures.\n"
+    sys.exit(1)
+
+  prevalence=readPrevalence(args.prevalence)
+  if args.ped is not None:
+    families=readPed(args.ped)
+    medAge=medianAge([m[4] for fid,members in families for m in members if m[0].endswith("PROBAND")])
+    groups=[(familyConfiguration(members,prevalence,medAge),[(fid,members)]) for fid,members in families]
+  else:
+    signatures=readSignatures(args.signatures)
+    probandAges=[(signatureMembers(key,"")[0][4],len(fids)) for key,fids in signatures]
+    medAge=medianAge([age for age,count in probandAges for i in range(count)])
+    groups=[(familyConfiguration(signatureMembers(key,""),prevalence,medAge),[(fid,signatureMembers(key,fid)) for fid in fids]) for key,fids in signatures]
+  configs=list(set([config for config,members in groups]))
+  print >> sys.stderr, "%d distinct family configurations among %d families\n" % (len(configs),sum([len(x) for config,x in groups]))
+
+  cache={}
+  if args.liabCache is not None:
+    cachePath=cacheFile(args.liabCache,args.heritability,args.samples,args.burnIn,args.thinning,args.seed)
+    cache=readCache(cachePath)
+  known=set(cache)
+  results=liabilities(configs,args.heritability,args.samples,args.burnIn,args.thinning,args.seed,cache)
+  if args.liabCache is not None:
+    writeCache(cachePath,cache,known)
+    print >> sys.stderr, "%d configurations from cache %s\n" % (len(known & set([configurationKey(*c) for c in configs])),cachePath)
+
+  rows=[]
+  for config,families in groups:
+    for fid,members in families:
+      rows.extend(zip([m[0] for m in members],results[config]))
+  writeLiabilities(args.output+".liab",rows)
+
+  if args.phenoFile is not None:
+    probands=dict((iid[:-len("_PROBAND")],liab) for iid,liab in rows if iid.endswith("_PROBAND"))
+    writePhenoLiabilities(args.phenoFile,args.output+".liab.phenoFile",probands)
+
+#call main
+if __name__ == "__main__":
+  main()
@@ -25,6 +25,9 @@
 #==============================================================================
 
 #Python 2.7.6
+# Pedigree rows are built a block of phenotype lines at a time and written with one write per block. The only
+# random draws (sex of the affected parent, sex of the sibling) come from a hash of --seed and the sample ID, so a sample
+# gets the same pedigree whichever block or process builds it and blocks built in parallel give the same file as a serial run.
 ############################
 ##### IMPORT MODULES #######
 ###########################
@@ -33,9 +36,11 @@ import argparse
 #import numpy
 #import rpy2
 from itertools import islice
+from multiprocessing import Pool
 import gzip, re, os, math, sys
 import copy
-import random
+import hashlib
+import compressedIO
 
 ###########################
 ##### PARSE ARGUMENTS ####
@@ -43,13 +48,18 @@ import random
 def get_settings():
   parser=argparse.ArgumentParser(
   description='''Script to create .ped file from phenotype file. Creates dummy F and M entries from self report affected family member''')
-  parser.add_argument("-p","--pheno",help="Phenotype file", type=str, required=True)
+  parser.add_argument("-p","--pheno",help="Phenotype file, plain text or gzip, bgzip or zstd compressed. Column 4 is sex and column 5 birth year", type=str, required=True)
   parser.add_argument("-cm","--columnMother",help="0-based column number for affected mother. Expects 1 if mother is affected and 0 otherwise.", type=int)
   parser.add_argument("-cf","--columnFather",help="0-based column number for affected father. Expects 1 if father is affected and 0 otherwise.", type=int)
   parser.add_argument("-cs","--columnSibling",help="0-based column number for affected sibling. Expects 1 if sibling is affected and 0 otherwise.", type=int)
-  parser.add_argument("-cp","--columnPhenotype",help="0-based column number for phenotype information. Expects 1 for case, 0 for control, NA for missing [default=12]",type=int,default=12)
-  parser.add_argument("-cr","--columnRelative",help="0-based column number of any affected first degree relative. Expects 1 if a 1st degree relative is affected.", type=int)
+  parser.add_argument("-cp","--columnPhenotype",help="0-based column number for phenotype information. Expects 1 for case, 0 for control, NA for missing with --columnMother, --columnFather and --columnSibling, and 2 for case, 1 for control with --columnRelative as in proxyCaseAssign1dr.py [default=12]",type=int,default=12)
+  parser.add_argument("-cr","--columnRelative",help="0-based column number of any affected first degree relative. Expects 2 if a 1st degree relative is affected and 1 if not, as in proxyCaseAssign1dr.py. Used when --columnMother, --columnFather and --columnSibling are not given [default=11]", type=int, default=11)
   parser.add_argument("-o","--outputFile",help="Prefix for output ped file.",type=str,required=True)
+  parser.add_argument("-z","--compress",help="Compress the ped file with bgzip (gz) or zstd (zst), adding .gz or .zst to its name",choices=["gz","zst"])
+  parser.add_argument("-t","--threads",help="Number of processes building pedigree rows from blocks of phenotype lines, also the number of threads decompressing the phenotype file and compressing the ped file. The ped file is the same for any number [default=1]",type=int,default=1)
+  parser.add_argument("-sg","--signatures",help="Name of file in which to print the pedigree signatures, one line per distinct pedigree (members with their sex, age bucket and phenotype) with the number of families and their FIDs, so liabilities can be estimated once per signature",type=str)
+  parser.add_argument("-ab","--ageBucket",help="Width in years of the age buckets in pedigree signatures, ages are rounded down to a multiple of it [default=1, exact age]",type=int,default=1)
+  parser.add_argument("-s","--seed",help="Seed of the random sex of the affected parent and of the sibling, drawn per sample from the seed and sample ID [default=12345]",type=int,default=12345)
   parser.set_defaults(remove=False)
   args=parser.parse_args()
   return args
@@ -60,90 +70,175 @@ def get_settings():
 ######### FUNCTIONS ########
 ############################
 
-#read in phenotype file
-def readPheno(file):
-  phenoDict={} #initialize
-  count=0
-  f=open(file,"r")
-  for line in f:
-    line = line.rstrip()
-    if count==0:
-      header=line #save header
-      count+=1
-    else:
-      line_list=line.split("\t")
-      phenoDict[line_list[0]]=line_list #ID is key and full line is value
-      count+=1
-  return phenoDict, header
+PED_HEADER=["FID","IID","FATHER","MOTHER","SEX ","AGE","PHENO"]
+BLOCK_LINES=100000 #phenotype lines per block
+AGE_YEAR=2018 #age is AGE_YEAR minus birth year
+PARENT_AGE_GAP=20 #estimating parents to be 20 years older
+DRAW_MOTHER=1 #bit of the per sample draw, set if the mother is the affected parent
+DRAW_SIBLING_FEMALE=2 #bit of the per sample draw, set if the sibling is female
+
+#blocks of phenotype lines (without newline) after the header line
+def phenoBlocks(file,threads=1,block=BLOCK_LINES):
+  f=compressedIO.openInput(file,threads)
+  f.readline() #skip header
+  for lines in iter(lambda: [x.rstrip() for x in islice(f,block)],[]):
+    yield lines
+  f.close()
+
+#random byte drawn per sample from the seed and sample ID, the same in every block and process
+def sampleDraws(ids,seed):
+  return [ord(hashlib.md5("%d\t%s" % (seed,x)).digest()[0]) for x in ids]
+
+#split a block of lines up to the last column used, sex and birth year columns included
+def splitBlock(lines,columns):
+  last=max(list(columns)+[5])
+  return [x.split("\t",last+1) for x in lines]
+
+#output status of proband and relatives, 1 for case, 0 for control and NA for anything else
+RELATIVE_STATUS={"1":"1","0":"0"}
+PROBAND_STATUS_RELATIVE={"2":"1","1":"0"} #phenotype coded as in proxyCaseAssign1dr.py
+#(relative value, mother is the affected parent) to status of mother and father, missing or unknown parents are NA
+PARENT_STATUS={("2",True):("1","0"),("2",False):("0","1"),("1",True):("0","0"),("1",False):("0","0")}
+
+#pedigree signature of a proband, mother and father, role, sex, age bucket and phenotype of every member
+SIGNATURE_RELATIVE="P,%s,%d,%s;M,2,%d,%s;F,1,%d,%s"
+SIGNATURE_FAM=SIGNATURE_RELATIVE+";S,%s,%d,%s" #and a sibling with the same parents
+SIGNATURE_HEADER=["SIGNATURE","COUNT","FID"]
+
+#ped lines of a proband, mother and father
+PED_RELATIVE="%s\t%s_PROBAND\t%s_FATHER\t%s_MOTHER\t%s\t%d\t%s\n%s\t%s_MOTHER\tNA\tNA\t2\t%d\t%s\n%s\t%s_FATHER\tNA\tNA\t1\t%d\t%s\n"
+#ped lines of a proband, mother, father and sibling of the same age with the same parents
+PED_FAM=PED_RELATIVE+"%s\t%s_SIBLING\t%s_FATHER\t%s_MOTHER\t%s\t%d\t%s\n"
+
+#pedigree of every sample in a block when the phenotype file only has information on any affected first degree relative
+#proband, then mother and father, the affected parent's sex is drawn per sample
+#returns the ped text and, if bucket is given, the (signature, FID) of every pedigree with ages in buckets of that many years
+def pedBlock_relative(lines,cp,cr,seed,bucket=None):
+  split=splitBlock(lines,[cp,cr])
+  text=[]
+  keys=[] if bucket else None
+  for x,draw in zip(split,sampleDraws([x[0] for x in split],seed)):
+    sample=x[0]
+    age=AGE_YEAR-int(x[5])
+    mom,dad=PARENT_STATUS.get((x[cr],(draw & DRAW_MOTHER)!=0),("NA","NA"))
+    pheno=PROBAND_STATUS_RELATIVE.get(x[cp],"NA")
+    text.append(PED_RELATIVE % (sample,sample,sample,sample,x[4],age,pheno,
+                                sample,sample,age+PARENT_AGE_GAP,mom,
+                                sample,sample,age+PARENT_AGE_GAP,dad))
+    if bucket:
+      parentAge=(age+PARENT_AGE_GAP)//bucket*bucket
+      keys.append((SIGNATURE_RELATIVE % (x[4],age//bucket*bucket,pheno,parentAge,mom,parentAge,dad),sample))
+  return "".join(text),keys
+
+#pedigree of every sample in a block when the phenotype file has information on affected mother, father and sibling
+#proband, mother, father and a sibling, the sibling's sex is drawn per sample, returns ped text and signatures as pedBlock_relative
+def pedBlock_fam(lines,cm,cf,cs,cp,seed,bucket=None):
+  split=splitBlock(lines,[cm,cf,cs,cp])
+  text=[]
+  keys=[] if bucket else None
+  for x,draw in zip(split,sampleDraws([x[0] for x in split],seed)):
+    sample=x[0]
+    age=AGE_YEAR-int(x[5])
+    pheno,mom,dad,sib=[RELATIVE_STATUS.get(x[c],"NA") for c in (cp,cm,cf,cs)]
+    siblingSex="2" if draw & DRAW_SIBLING_FEMALE else "1"
+    text.append(PED_FAM % (sample,sample,sample,sample,x[4],age,pheno,
+                           sample,sample,age+PARENT_AGE_GAP,mom,
+                           sample,sample,age+PARENT_AGE_GAP,dad,
+                           sample,sample,sample,sample,siblingSex,age,sib))
+    if bucket:
+      ageKey=age//bucket*bucket
+      parentAge=(age+PARENT_AGE_GAP)//bucket*bucket
+      keys.append((SIGNATURE_FAM % (x[4],ageKey,pheno,parentAge,mom,parentAge,dad,siblingSex,ageKey,sib),sample))
+  return "".join(text),keys
+
+#block builder and its arguments, set once per worker process
+_pedSettings={}
+
+def initPedWorker(builder,args):
+  _pedSettings.update(builder=builder,args=args)
+
+def pedWorker(lines):
+  return _pedSettings["builder"](lines,*_pedSettings["args"])
+
+#write the pedigree of every phenotype line in file order, blocks are built by a pool of processes when threads > 1
+#imap gives blocks back in order and every random draw depends on the sample only, so the output is the same for any threads
+#the last builder argument is the age bucket of signatures, if given returns the FIDs of every signature in order of first appearance
+def writePed(file,builder,args,out,threads=1):
+  signatures={}
+  order=[]
+  if threads > 1:
+    pool=Pool(threads,initPedWorker,(builder,args))
+    blocks=pool.imap(pedWorker,phenoBlocks(file,threads))
+  else:
+    initPedWorker(builder,args)
+    blocks=(pedWorker(lines) for lines in phenoBlocks(file,threads))
+  try:
+    for text,keys in blocks:
+      out.write(text)
+      if keys is not None:
+        for key,fid in keys:
+          if key not in signatures:
+            signatures[key]=[]
+            order.append(key)
+          signatures[key].append(fid)
+    if threads > 1:
+      pool.close()
+      pool.join()
+  finally:
+    if threads > 1:
+      pool.terminate() #workers are stopped if a block raises
+  return [(key,signatures[key]) for key in order]
+
+#print pedigree signatures, the number of families with each and their comma separated FIDs
+def writeSignatures(file,signatures,threads=1):
+  f=compressedIO.openOutput(file,threads)
+  print >> f, "\t".join(SIGNATURE_HEADER)
+  for key,fids in signatures:
+    print >> f, "\t".join([key,str(len(fids)),",".join(fids)])
+  f.close()
 
 #make pedigree if you have info on affected mother, father, sibling
-def makePed_fam(phenoDict,cm,cf,cs,cp):
-
-  return 0
+#returns the pedigree signatures when bucket is given (see writePed)
+def makePed_fam(file,cm,cf,cs,cp,out,seed=12345,threads=1,bucket=None):
+  return writePed(file,pedBlock_fam,(cm,cf,cs,cp,seed,bucket),out,threads)
 
 #make pedigree if you have info on affected first degree relative in general
 # in output 1 is case and 0 is control and NA is missing
 # 2 is female and 1 is male
-def makePed(phenoDict,cp,cr,out):
-  for id,value in phenoDict.iteritems():
-    #figure out phenotype of proband
-    proband_id="_".join([value[0],"PROBAND"])
-
-    #randomly choose sex of affected parent
-    parent=random.randint(1,2)
-    mom_id="_".join([value[0],"MOTHER"])
-    dad_id="_".join([value[0],"FATHER"])
-    parent_entry="\t".join([dad_id,mom_id])
-    if value[11]=="2": #case
-      out.write("\t".join([value[0],proband_id,parent_entry,str(value[4]),str(2018-int(value[5])),str(1)])) #print proband line
-    elif value[11]=="1": #control
-      out.write("\t".join([value[0],proband_id,parent_entry,str(value[4]),str(2018-int(value[5])),str(0)])) #print proband line
-    else: #NA
-      out.write("\t".join([value[0],proband_id,parent_entry,str(value[4]),str(2018-int(value[5])),"NA"])) #print proband line
-    out.write("\n")
-    
-    #create dummy mom and dad
-    parent_age=str(2018-int(value[5])+20) #estimating parents to be 20 years older
-    if value[12]=="2": #yes affected relative
-      if parent==2: #make mom affected
-        out.write("\t".join([value[0],mom_id,"NA","NA","2",parent_age,str(1)]))
-        out.write("\n")
-        out.write("\t".join([value[0],dad_id,"NA","NA","1",parent_age,str(0)]))
-      elif parent==1: #make dad affected
-        out.write("\t".join([value[0],mom_id,"NA","NA","2",parent_age,str(0)]))
-        out.write("\n")
-        out.write("\t".join([value[0],dad_id,"NA","NA","1",parent_age,str(1)]))
-    elif value[12]=="1": #no affected relative
-      out.write("\t".join([value[0],mom_id,"NA","NA","2",parent_age,str(0)]))
-      out.write("\n")
-      out.write("\t".join([value[0],dad_id,"NA","NA","1",parent_age,str(0)]))
-    else: #missing or unknown
-      out.write("\t".join([value[0],mom_id,"NA","NA","2",parent_age,"NA"]))
-      out.write("\n")
-      out.write("\t".join([value[0],dad_id,"NA","NA","1",parent_age,"NA"]))
-    out.write("\n")
-      
-  return 0
-  
+def makePed(file,cp,cr,out,seed=12345,threads=1,bucket=None):
+  return writePed(file,pedBlock_relative,(cp,cr,seed,bucket),out,threads)
+
 #########################
 ########## MAIN #########
 #########################
 
-def main():  
+def main():
     args = get_settings()
 
-    phenoDict,header=readPheno(args.pheno) #read phenotype file with proxy-case definition
-
-    out=".".join([args.outputFile,"ped"])
-    o=open(out,"w")
-    o.write("\t".join(["FID","IID","FATHER","MOTHER", "SEX ","AGE", "PHENO\n"])) #should we be working in the birthYear space?
-    
-    random.seed(12345) #set seed 
-    makePed(phenoDict,args.columnPhenotype,args.columnRelative,o)
+    family=[args.columnMother,args.columnFather,args.columnSibling]
+    if any(x is not None for x in family) and not all(x is not None for x in family):
+      print >> sys.stderr, "Please give all of --columnMother, --columnFather and --columnSibling, or none of them to use --columnRelative.\n"
+      sys.exit(1)
+    if args.ageBucket < 1:
+      print >> sys.stderr, "--ageBucket must be at least 1 year.\n"
+      sys.exit(1)
+    bucket=args.ageBucket if args.signatures is not None else None #signatures are only made when asked for
+
+    out=compressedIO.compressedName(".".join([args.outputFile,"ped"]),args.compress)
+    o=compressedIO.openOutput(out,args.threads)
+    o.write("\t".join(PED_HEADER)+"\n") #should we be working in the birthYear space?
+
+    if args.columnMother is not None:
+      signatures=makePed_fam(args.pheno,args.columnMother,args.columnFather,args.columnSibling,args.columnPhenotype,o,args.seed,args.threads,bucket)
+    else:
+      signatures=makePed(args.pheno,args.columnPhenotype,args.columnRelative,o,args.seed,args.threads,bucket)
 
     o.close()
-    
+
+    if args.signatures is not None:
+      writeSignatures(args.signatures,signatures,args.threads)
+      print >> sys.stderr, "%d pedigree signatures among %d families\n" % (len(signatures),sum([len(fids) for key,fids in signatures]))
+
 #call main
 if __name__ == "__main__":
   main()
-
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Columnar phenotype store used by proxyCaseAssign1dr.py and proxyCaseAssignAffRel.py.
+# Only the columns used for assignment are kept, as int8 code arrays. Every other column is
+# written back verbatim from the original line. Parquet and Arrow phenotype files are read column-projected
+# and their lines are only made when output needs them.
+############################
+##### IMPORT MODULES #######
+###########################
+import sys
+from array import array
+from itertools import islice
+import numpy as np
+import arrowIO
+import compressedIO
+
+############################
+######### FUNCTIONS ########
+############################
+
+#status codes for case/control and self report columns
+STATUS_MISSING=-1 #NA, unknown or any value not listed for the column
+STATUS_CONTROL=0 #control, or no affected relative for self report columns
+STATUS_CASE=1 #case, or affected relative for self report columns
+
+#proxy-case assignment (F) codes, 4*F so codes sort like the F values
+F_NA=-1
+F_CONTROL=0 #F=0
+F_PROXY2=1 #F=0.25, second degree proxy-case
+F_PROXY=2 #F=0.5, first degree proxy-case
+F_CASE=4 #F=1
+F_STRINGS={F_NA:"NA",F_CONTROL:"0",F_PROXY2:"0.25",F_PROXY:"0.5",F_CASE:"1"}
+F_CODES=dict((v,k) for k,v in F_STRINGS.items())
+F_ORDER=[F_NA,F_CONTROL,F_PROXY2,F_PROXY,F_CASE] #F codes in output order, position is the F category
+F_CATEGORY=np.zeros(F_CASE+2,dtype=np.int8) #F code+1 to F category
+F_CATEGORY[[x+1 for x in F_ORDER]]=range(len(F_ORDER))
+F_VALUES=np.full(F_CASE+2,np.nan) #F code+1 to F value, NaN for NA
+F_VALUES[[x+1 for x in F_ORDER]]=[np.nan,0,0.25,0.5,1]
+BLOCK_LINES=100000 #phenotype lines per block when streaming
+
+#phenotype file held as raw lines plus int8 code arrays for the columns used in assignment
+class PhenoStore(object):
+  def __init__(self,header,ids,lines,columns,totalCol,source=None):
+    self.header=header #header line, empty string if file has no header
+    self.ids=ids #sample IDs in file order, position in list is the integer index
+    self.idIndex=dict((sample,i) for i,sample in enumerate(ids))
+    self._lines=lines #raw lines without newline, None until first used for a Parquet or Arrow file
+    self.columns=columns #0-based column number to int8 code array
+    self.totalCol=totalCol #number of columns, F is added as column totalCol
+    self.source=source #(Parquet or Arrow file, row of each sample), None for text files
+
+  #lines of a Parquet or Arrow file are made from every column the first time they are needed
+  @property
+  def lines(self):
+    if self._lines is None:
+      file,rows=self.source
+      lines=["\t".join(x) for x in zip(*arrowIO.readColumns(file))]
+      self._lines=[lines[r] for r in rows]
+    return self._lines
+
+  def __len__(self):
+    return len(self.ids)
+
+  def __contains__(self,sample):
+    return sample in self.idIndex
+
+#last column split from each line, fields after it are never split into separate strings
+def lastColumn(codes,idCol=0):
+  return max(list(codes)+[idCol])
+
+#status codes of every column in codes for a block of lines split up to lastColumn
+def blockCodes(split,codes):
+  return dict((col,[values.get(x[col],STATUS_MISSING) for x in split]) for col,values in codes.items())
+
+#read phenotype file (plain, gzip, bgzip, zstd, Parquet or Arrow), codes maps 0-based column number to a dict of value string to status code
+#lines are read in blocks and split only up to the last column used, other columns are kept in the raw line for output
+#a sample ID seen twice keeps its last line, as the dictionary this replaces did
+def readPheno(file,codes,idCol=0,header=True,threads=1):
+  if file!="-" and compressedIO.fileFormat(file) in arrowIO.FORMATS:
+    return readArrowPheno(file,codes,idCol)
+  ids=[]
+  idIndex={}
+  lines=[]
+  columns=dict((col,array("b")) for col in codes)
+  last=lastColumn(codes,idCol)
+  line=""
+  headerLine=""
+  f=compressedIO.openInput(file,threads)
+  if header:
+    headerLine=next(f).rstrip()
+  for block in iter(lambda: [x.rstrip() for x in islice(f,BLOCK_LINES)],[]):
+    split=[x.split("\t",last+1)[:last+1] for x in block] #rest of the line is dropped as soon as it is split off
+    status=blockCodes(split,codes)
+    base=len(ids)
+    rows=[] #row of the block holding the line of each new sample
+    for r,(line_list,line) in enumerate(zip(split,block)):
+      sample=line_list[idCol]
+      i=idIndex.get(sample)
+      if i is None:
+        idIndex[sample]=len(ids)
+        ids.append(sample)
+        lines.append(line)
+        rows.append(r)
+      else:
+        lines[i]=line
+        if i >= base: #first seen in this block
+          rows[i-base]=r
+        else:
+          for col in codes:
+            columns[col][i]=status[col][r]
+    for col in codes:
+      columns[col].extend(status[col] if len(rows)==len(block) else [status[col][r] for r in rows])
+  f.close()
+  totalCol=line.count("\t")+1 if line else 0
+  columns=dict((col,np.frombuffer(values,dtype=np.int8)) for col,values in columns.items())
+  return PhenoStore(headerLine,ids,lines,columns,totalCol)
+
+#read only the ID column and the columns in codes of a Parquet or Arrow phenotype file, column names are the header
+#a sample ID seen twice keeps its last row, as for text files
+def readArrowPheno(file,codes,idCol=0):
+  names=arrowIO.columnNames(file)
+  cols=sorted(set(list(codes)+[idCol]))
+  values=dict(zip(cols,arrowIO.readColumns(file,cols)))
+  ids=[]
+  idIndex={}
+  rows=[] #row of the file holding each sample
+  for r,sample in enumerate(values[idCol]):
+    i=idIndex.get(sample)
+    if i is None:
+      idIndex[sample]=len(ids)
+      ids.append(sample)
+      rows.append(r)
+    else:
+      rows[i]=r
+  columns=dict((col,np.array([status.get(x,STATUS_MISSING) for x in values[col]],dtype=np.int8)[rows]) for col,status in codes.items())
+  return PhenoStore("\t".join(names),ids,None,columns,len(names),(file,rows))
+
+#phenotype file, or standard input for -
+def openPheno(file,threads=1):
+  return compressedIO.openInput(file,threads)
+
+#PhenoStore of a block of lines without newlines, every line is kept even if its ID was seen before
+def blockStore(header,lines,codes,idCol=0):
+  last=lastColumn(codes,idCol)
+  split=[line.split("\t",last+1)[:last+1] for line in lines]
+  columns=dict((col,np.array(values,dtype=np.int8)) for col,values in blockCodes(split,codes).items())
+  return PhenoStore(header,[x[idCol] for x in split],lines,columns,lines[-1].count("\t")+1 if lines else 0)
+
+#read phenotype file (or standard input for -) in blocks of lines and yield a PhenoStore per block, at least one even if the file has no samples
+#memory use depends on the block size only and blocks come in file order
+def streamPheno(file,codes,idCol=0,header=True,block=BLOCK_LINES,threads=1):
+  f=openPheno(file,threads)
+  headerLine=f.readline().rstrip() if header else ""
+  first=True
+  while True:
+    lines=[line.rstrip() for line in islice(f,block)]
+    if not lines and not first:
+      break
+    first=False
+    yield blockStore(headerLine,lines,codes,idCol)
+  f.close()
+
+#F code array to F category array (position of each code in F_ORDER)
+def f_category(F):
+  return F_CATEGORY[F.astype(np.int16)+1]
+
+#F code array to float64 F values, NaN for NA
+def f_values(F):
+  return F_VALUES[F.astype(np.int16)+1]
+
+#F code array to list of output strings
+def f_strings(F):
+  return [F_STRINGS[x] for x in F.tolist()]
+
+#print phenotype file with one new column per F vector, in the order given
+def print_Fs(ps,Fs,labels,out=sys.stdout,header=True):
+  if ps.header and header:
+    print >> out, "\t".join([ps.header]+list(labels))
+  for line,f in zip(ps.lines,zip(*[f_strings(F) for F in Fs])):
+    print >> out, "\t".join((line,)+f)
+
+#column names and columns of the phenotype file for Parquet or Arrow output, Arrow arrays for a Parquet or Arrow input
+#and lists of text values otherwise, replace maps a column number to a (name, F code array) written in its place
+def pheno_table(ps,replace=None):
+  replace=replace or {}
+  names=ps.header.split("\t") if ps.header else ["col%d" % c for c in range(ps.totalCol)]
+  if ps.source is not None and ps._lines is None:
+    columns=arrowIO.readArrays(*ps.source)
+  else:
+    split=[line.split("\t") for line in ps.lines]
+    columns=[[x[c] for x in split] for c in range(len(names))]
+  for c,(name,F) in replace.items():
+    names[c]=name
+    columns[c]=f_values(F)
+  return names,columns
+
+#write the phenotype file with one new column per F vector as Parquet or Arrow, F is a float column with NA as null
+def write_Fs_arrow(ps,Fs,labels,file):
+  names,columns=pheno_table(ps)
+  arrowIO.writeTable(file,names+list(labels),columns+[f_values(F) for F in Fs])
+
+#print results to standard output with print_results (the function of the calling script), or to the file name given,
+#which is written as Parquet or Arrow when named .parquet or .arrow
+def write_results(ps,Fs,labels,proxy,output,print_results,name=None,threads=1,header=False):
+  if name is not None and arrowIO.outputFormat(name):
+    if proxy=="A":
+      arrowIO.writeTable(name,["IID"]+list(labels),[ps.ids]+[f_values(F) for F in Fs])
+    else:
+      write_Fs_arrow(ps,Fs,labels,name)
+    return
+  out=sys.stdout if name is None else compressedIO.openOutput(name,threads)
+  print_results(ps,Fs,labels,proxy,output,out,header)
+  if out is not sys.stdout:
+    out.close()
+
+#write a table of named columns, the first a list of text values (e.g. sample IDs) and the others integer arrays
+#as Parquet or Arrow when file is named .parquet or .arrow and tab delimited text otherwise
+def write_counts(file,header,ids,columns,threads=1):
+  if arrowIO.outputFormat(file):
+    arrowIO.writeTable(file,header,[ids]+[np.ascontiguousarray(x) for x in columns])
+    return
+  f1=compressedIO.openOutput(file,threads)
+  print >> f1, "\t".join(header)
+  for sample,data in zip(ids,np.column_stack(columns).tolist()):
+    print >> f1, "\t".join([sample]+[str(x) for x in data])
+  f1.close()
+
+#parse a list of 0-based column numbers such as 12, 12,14,16 or 12-20 (ranges include both ends)
+def parse_columns(value):
+  columns=[]
+  for field in value.split(","):
+    if "-" in field:
+      start,end=field.split("-")
+      columns.extend(range(int(start),int(end)+1))
+    else:
+      columns.append(int(field))
+  return columns
+
+#pair the phenotype columns of each trait with the columns holding relative information for that trait
+#a relative column list of length one is used for every trait, otherwise it needs one column per trait
+def trait_columns(cps,*others):
+  for columns in others:
+    if len(columns)!=1 and len(columns)!=len(cps):
+      raise ValueError("%d phenotype columns but %d relative columns given" % (len(cps),len(columns)))
+  return [tuple([cp]+[columns[0] if len(columns)==1 else columns[i] for columns in others]) for i,cp in enumerate(cps)]
+
+#trait names from the header labels of the phenotype columns, col<number> if there is no header or the label repeats
+def trait_names(ps,cps):
+  header=ps.header.split("\t") if ps.header else []
+  labels=[header[cp] if cp<len(header) and header[cp] else "" for cp in cps]
+  return [x if x and labels.count(x)==1 else "col%d" % cp for x,cp in zip(labels,cps)]
@@ -34,24 +34,37 @@ from itertools import islice
 import gzip, re, os, math, sys
 import copy
 import datetime
+import numpy as np
+import arrowIO
+import compressedIO
+import kinshipGraph
+import phenoStore
+import proxyEngine
 
 ###########################
 ##### PARSE ARGUMENTS ####
 ###########################
 def get_settings():
   parser = argparse.ArgumentParser(description='''Script to perform proxy-case assignment using kinship matrix from KING2, self reported affected relative status of mother, father, sibling, and case/control status from EHR derived phenotypes. The default is an output of the phenotype file with an additional column holding the proxy-case assignment.''')
-  parser.add_argument("-k", "--kinship", help="Kinship from KING2 and requires header. Assumes FID1, ID1, FID2, ID2 and additional columns may vary.", type=str)
-  parser.add_argument("-ck","--columnKin",help="0-based column number with Kinship value from KING.",default=8,type=int)
-  parser.add_argument("-p", "--pheno",help="Tab delimited phenotype file. First column must be an ID specific to the individual sample (e.g. IID). Header expected",type=str,required=True)
-  parser.add_argument("-cm","--columnMother",help="0-based column number for affected mother. Expects 1 if mother is affected and 0 otherwise.", type=int,required=True)
-  parser.add_argument("-cf","--columnFather",help="0-based column number for affected father. Expects 1 if father is affected and 0 otherwise.", type=int,required=True)
-  parser.add_argument("-cs","--columnSibling",help="0-based column number for affected sibling. Expects 1 if sibling is affected and 0 otherwise.", type=int,required=True)
-  parser.add_argument("-cp","--columnPhenotype",help="0-based column number for phenotype information. Expects 1 for case, 0 for control, NA for missing [default=12]",type=int,default=12)
+  parser.add_argument("-k", "--kinship", help="Kinship from KING2 and requires header. Assumes FID1, ID1, FID2, ID2 and additional columns may vary. A Parquet or Arrow table is read one batch of the ID1, ID2 and Kinship columns at a time.", type=str)
+  parser.add_argument("-ck","--columnKin",help="0-based column number with Kinship value from KING [default=column named Kinship in header]",type=int)
+  parser.add_argument("-t","--threads",help="Number of processes used to parse the kinship file. Plain text and bgzip files are split into chunks, gzip and zstd files are parsed by one process while another thread decompresses them. Also the number of processes assigning proxy-cases with kinship, each given shards of whole families, and the number of threads compressing output files, which are bgzip compressed when named .gz or .bgz and zstd compressed when named .zst [default=1]",type=int,default=1)
+  parser.add_argument("-kc","--kinCache",help="Directory in which to cache the parsed kinship graph. Reused while the kinship file, its size and modification time, --columnKin and the samples kept are unchanged",type=str)
+  parser.add_argument("-p", "--pheno",help="Tab delimited phenotype file. First column must be an ID specific to the individual sample (e.g. IID). Header expected. A Parquet or Arrow table is read with only the columns used for assignment",type=str,required=True)
+  parser.add_argument("-cm","--columnMother",help="0-based column number for affected mother. Expects 1 if mother is affected and 0 otherwise. With several traits give one column per trait in the same order as --columnPhenotype, or one column shared by every trait", type=phenoStore.parse_columns,required=True)
+  parser.add_argument("-cf","--columnFather",help="0-based column number for affected father. Expects 1 if father is affected and 0 otherwise. With several traits give one column per trait in the same order as --columnPhenotype, or one column shared by every trait", type=phenoStore.parse_columns,required=True)
+  parser.add_argument("-cs","--columnSibling",help="0-based column number for affected sibling. Expects 1 if sibling is affected and 0 otherwise. With several traits give one column per trait in the same order as --columnPhenotype, or one column shared by every trait", type=phenoStore.parse_columns,required=True)
+  parser.add_argument("-cp","--columnPhenotype",help="0-based column number for phenotype information. Expects 1 for case, 0 for control, NA for missing. Several traits may be given as a list and/or range of columns, e.g. 12,14,20-30 [default=12]",type=phenoStore.parse_columns,default="12")
   parser.add_argument("-o", "--output",help="Type of output file (BOLT-LMM=B, PLINK=P); default is additional column at end of phenotype file", type=str)
+  parser.add_argument("-ot", "--outputTrait",help="With several traits, print one output file per trait named <outputTrait>.<trait> (and --model1 and --number files with .<trait> added before any .gz, .zst, .parquet or .arrow extension) instead of one wide output with a column per trait. Traits are named by the header of their phenotype column", type=str)
+  parser.add_argument("-of", "--outputFile",help="File in which to print results instead of standard output. Output named .gz or .bgz is bgzip compressed and .zst zstd compressed. Output named .parquet or .arrow (also for --outputTrait, --model1 and --number) is written as a Parquet or Arrow IPC table with F as a numeric column, for the default output format and -x A", type=str)
   parser.add_argument("-cc", "--conservControl", help="Requires conservative control (unknown or missing on self report questions are not allowed to be controls), less stringent control is default",action="store_true")
   parser.add_argument("-x", "--proxy",help="Type of logic used to identify proxy-cases [all=A, kinship only=K, self report only=SR, self report minus kinship=SMK, self report plus kinship=SPK]",type=str,required=True)
-  parser.add_argument("-n","--number",help="Name of file in which to print number of cases/proxy-cases every sample is related to. If file is not provided then this functionality will not happen.",type=str)
+  parser.add_argument("-n","--number",help="Name of file in which to print number of cases/proxy-cases every sample is related to. If file is not provided then this functionality will not happen. Header line, then IID, proxyCaseRelatives, caseRelatives and firstDegreeRelatives, counted over first degree relatives (kinship 0.177 to 0.354) among the phenotyped samples, then duplicate, 2nd and 3rd degree relative counts and first degree relatives in each F category. Versions before the kinship graph had no header and counted every pair of the kinship file listing the sample as ID1, of any kinship",type=str)
+  parser.add_argument("-fa","--family",help="Name of file in which to print the family of every sample, numbered connected components of first degree relatives among the phenotyped samples, and the size of that family. Requires --kinship",type=str)
+  parser.add_argument("-fs","--familySummary",help="Name of file in which to print the size of every family and its number of cases, proxy-cases, controls and NA. With several traits and --outputTrait one file per trait is printed, named like the --number files. Requires --kinship",type=str)
   parser.add_argument("-m","--model1",help="Name of file in which to print model 1 (standard GWAS) phenotype file. This file will be similar to --pheno input file, but header for phenotype column will be F and values will be 1 for case, 0 for control, NA for missing for consistency with proxyModel.py phenotype files\n",type=str,required=True)
+  parser.add_argument("-st","--stream",help="Read, assign and write the phenotype file in blocks of lines so memory use does not grow with the number of samples. Rows keep the order of --pheno (give - to read standard input) and a sample ID seen twice is kept twice. Only with -x SR and without --number",action="store_true")
   args = parser.parse_args()
   print >> sys.stderr, "%s\n" % args
   return args
@@ -61,241 +74,121 @@ def get_settings():
 ######### FUNCTIONS ########
 ############################
 
+#values of the phenotype column (1 case, 0 control) and the mother, father, sibling columns (1 affected, 0 not affected), anything else is missing
+PHENO_CODES={"1":phenoStore.STATUS_CASE,"0":phenoStore.STATUS_CONTROL}
+RELATIVE_CODES={"1":phenoStore.STATUS_CASE,"0":phenoStore.STATUS_CONTROL}
 
-#open file taking zipped or unzipped into account
-def openFile(filename):
-  if ".gz" in filename:
-    command=gzip.open(filename,"rt")
-    print >> sys.stderr, "Opening zipped file\n"
-  elif ".gz" not in filename:
-    command=open(filename,"rt")
-    print >> sys.stderr, "Opening unzipped file\n"
-  return command
-
-
-#these numbers are from http://people.virginia.edu/~wc9c/KING/manual.html
-def is_first_degree_relative(kinship):
-  return (float(kinship) >= 0.177 and float(kinship) <= 0.354)
-
-
-# read kinship file, assumes FID and IID are equal because no family info
-def readKinship(file,col):
-  kinDict = {}  # intialize
-  openCommand=openFile(file) #handle zipped file
-  with openCommand as f:
-    next(f)  # skip header
-    for line in f:
-      line = line.rstrip()
-      lineList = line.split("\t")
-      IID1=lineList[1]
-      IID2=lineList[3]
-      KinVal=lineList[col]
-      if IID1 not in kinDict.keys():
-        kinDict[IID1] = {}  # initalize
-        kinDict[IID1][IID2] = KinVal
-  f.close()
-  return kinDict
+#labels of the F vectors returned for each type of logic
+PROXY_LABELS={"SR":[""],"SMK":[""],"SPK":[""],"K":[""],"A":["SR","SMK","SPK","K"]}
+
+#value codes of every column used for assignment, traits is a list of (cp, cm, cf, cs) columns
+def pheno_codes(traits):
+  codes={}
+  for cp,cm,cf,cs in traits:
+    codes.update({cm:RELATIVE_CODES,cf:RELATIVE_CODES,cs:RELATIVE_CODES})
+  for cp,cm,cf,cs in traits:
+    codes[cp]=PHENO_CODES
+  return codes
 
 #read phenotype file with case/control information for sample and affected status of relatives
-def readPheno(file):
-  phenoDict = {}  # initialize
-  totalCol=0 #initialize count of columns so we know what is new column to add proxycase assignment
-  count=0
-  f = open(file, "r")
-  for line in f:
-    line = line.rstrip()
-    if count==0:
-      header=line
-      count+=1
-    else:
-      line_list = line.split("\t")
-      #replace -9 with NA
-      line_list_v2=["NA" if x=="-9" else x for x in line_list]
-      phenoDict[line_list[0]] = line_list
-      totalCol=len(line_list)
-  return phenoDict,totalCol,header
+def readPheno(file,traits,threads=1):
+  return phenoStore.readPheno(file,pheno_codes(traits),threads=threads)
 
 #Perform proxy case assignment using information on case/control status of the sample and the kinship matrix with the rest of samples in the study
-def proxy_via_kinship(pd, kd, cc, tc, cp):
-  pd_kinship = copy.deepcopy(pd)
-
+def proxy_via_kinship(ps, kg, cc, cp):
   if cc:
     print >> sys.stderr, 'Conservative control functionality is not available with kinship only option\n'
 
-  for sample in pd:
-    if pd[sample][cp] == '1':  # if case
-      pd_kinship[sample].append("1")  # set as case
-    elif pd[sample][cp] == '0':  # if control
-      pd_kinship[sample].append("0")  # set as control
-    else: #if missing or NA
-      pd_kinship[sample].append("NA") #missing
-      #sys.stderr.write("Sample %s is neither case (1) nor control (0).\n" % sample)
-
-  for ID1, v in kd.items():  # for every ID1 in kinship dictionary
-    for ID2, kinship in v.items():  # for every ID2 in kinship dictionary
-      if ID1 in pd.keys() and ID2 in pd.keys():
-
-        if is_first_degree_relative(kinship):  # if first degree relative
-          if pd[ID1][cp] == '1' and pd[ID2][cp] == '0':  # if case and unaffected
-            if pd_kinship[ID2][tc] == 'NA' or float(pd_kinship[ID2][tc]) < 0.5: #if control or missing
-              pd_kinship[ID2][tc] = "0.5"  # assign as proxy-case
-          elif pd[ID1][cp] == '0' and pd[ID2][cp] == '1':  # if unaffected and case
-            if pd_kinship[ID1][tc] == 'NA' or float(pd_kinship[ID1][tc]) < 0.5: #if control or missing
-              pd_kinship[ID1][tc] = "0.5"  # assign as proxy-case
-        #else:  
-          #print >> sys.stderr, "%s and %s are not first degree relatives based on kinship\n"  % (ID1,ID2)
-
-  return pd_kinship
+  # cases are 1, controls are 0 and assigned as proxy-case if a first degree relative is a case, missing or NA are NA
+  status = ps.columns[cp]
+  return proxyEngine.kinship_F(status, proxyEngine.case_relatives(kg, status))
 
 #Perform proxy case assignment using information on case/control status of the sample and the self reported status of mother, father, sibling
-def proxy_via_selfreport(pd, cc, cp, cm, cf, cs):
-  pd_sr = copy.deepcopy(pd)
-
-  for sample in pd:  # for every sample id in phenotype file
-    if pd[sample][cp] == '1':  # if case
-      pd_sr[sample].append("1")  # set as case
-
-    elif pd[sample][cp] == '0':  # if unaffected
-
-      #To Do: add functionality so we can define proxy-case based on granularity of WHO is affected (parent vs sibling)
-      if pd[sample][cm] == '1' or pd[sample][cf] == "1" or pd[sample][cs] == "1" :  # if have an affected first degree relative
-        pd_sr[sample].append("0.5")  # set as proxy-case
-
-      elif pd[sample][cm] == '0' and pd[sample][cf] == "0" and pd[sample][cs] == "0":  # if dont have an affected first degree relative
-        pd_sr[sample].append("0") #set as control
-
-      else: #if missing or NA affected first degree relative status
-        if cc: #if conservative control option
-          pd_sr[sample].append("NA")
-        else:
-          pd_sr[sample].append("0") #set as control if conservative control option not invoked
-    
-    else: #if missing or NA for case
-
-      if pd[sample][cm] == '1' or pd[sample][cf] == "1" or pd[sample][cs] == "1" :  # if have an affected first degree relative
-        pd_sr[sample].append("0.5")  # set as proxy-case, could be case but is at least known proxy case
-      else:  
-        pd_sr[sample].append("NA") #missing
-      #sys.stderr.write("Sample %s is neither case (1) nor control (0)\n." % sample)
-      
-  return pd_sr
-
-#Refine proxy case assignment by self report by considering kinship matrix (e.g. if a proxy-case's affected relative is a case in the study the proxy-case will become NA)
-def proxy_via_selfreport_minus_kinship(pd, kd, tc):
-  pd_smk = copy.deepcopy(pd)
-
-  for ID1, v in kd.items():  # for every ID1 in kinship dictionary
-    for ID2, kinship in v.items():  # for every ID2 in kinship dictionary
-      if is_first_degree_relative(kinship):  # if first degree relative
-        if ID1 in pd.keys() and ID2 in pd.keys():  # if IDs from kinship matrix are in phenotype file
-          # reassign to NA if proxy-case or 2nd degree proxy-case has case in cohort
-          if (pd[ID1][tc] == "0.5" and pd[ID2][tc] == "1"):
-            pd_smk[ID1][tc] = "NA"
-          elif (pd[ID1][tc] == "1" and pd[ID2][tc] == "0.5"):
-            pd_smk[ID2][tc] = "NA"
-          # reassign to NA if control has case in cohort
-          if (pd[ID1][tc] == "0" and pd[ID2][tc] == "1"):
-            pd_smk[ID1][tc] = "NA"
-          elif (pd[ID1][tc] == "1" and pd[ID2][tc] == "0"):
-            pd_smk[ID2][tc] = "NA"
-      #else:  
-        #print >> sys.stderr, "%s and %s are not first degree relatives based on kinship, leaving proxy-case assignment as is from self report\n" % (ID1,ID2)
-
-  return pd_smk
+def proxy_via_selfreport(ps, cc, cp, cm, cf, cs):
+  status = ps.columns[cp]
+  #To Do: add functionality so we can define proxy-case based on granularity of WHO is affected (parent vs sibling)
+  affected = (ps.columns[cm] == phenoStore.STATUS_CASE) | (ps.columns[cf] == phenoStore.STATUS_CASE) | (ps.columns[cs] == phenoStore.STATUS_CASE)  # have an affected first degree relative
+  unaffected = (ps.columns[cm] == phenoStore.STATUS_CONTROL) & (ps.columns[cf] == phenoStore.STATUS_CONTROL) & (ps.columns[cs] == phenoStore.STATUS_CONTROL)  # dont have an affected first degree relative
+  F = np.full(len(ps), phenoStore.F_NA, dtype=np.int8)  # missing or NA
+  F[status == phenoStore.STATUS_CASE] = phenoStore.F_CASE  # set as case
 
-#Refine proxy case assignemnt by self report by considering kinship matrix (e.g. if a control does not report an affected first degree relative but we identify one in the study using kinship matrix, the control will become a proxy-case)
-def proxy_via_selfreport_plus_kinship(pd, kd, tc):
-  pd_spk = copy.deepcopy(pd)
+  control = status == phenoStore.STATUS_CONTROL  # if unaffected
+  F[control & affected] = phenoStore.F_PROXY  # set as proxy-case
+  F[control & ~affected & unaffected] = phenoStore.F_CONTROL  # set as control
+  if not cc:  # set as control if conservative control option not invoked
+    F[control & ~affected & ~unaffected] = phenoStore.F_CONTROL
 
-  for ID1, v in kd.items():  # for every ID1 in kinship dictionary
-    for ID2, kinship in v.items():  # for every ID2 in kinship dictionary
+  # if missing or NA for case but have an affected first degree relative set as proxy-case, could be case but is at least known proxy case
+  F[(status == phenoStore.STATUS_MISSING) & affected] = phenoStore.F_PROXY
 
-      if is_first_degree_relative(kinship):  # if first degree relative
-        if ID1 in pd.keys() and ID2 in pd.keys():  # if IDs from kinship matrix are in phenotype file
-          # reassign to 0.5 if control is 1dr to a case or NA from self report (consv control) is related to a case
-          if (pd[ID1][tc] == "0" and pd[ID2][tc] == "1") or (pd[ID1][tc] == "NA" and pd[ID2][tc] == "1"):
-            if pd_spk[ID1][tc] == 'NA' or float(pd_spk[ID1][tc]) < 0.5:
-              pd_spk[ID1][tc] = "0.5"
-          elif (pd[ID1][tc] == "1" and pd[ID2][tc] == "0") or (pd[ID1][tc] == "1" and pd[ID2][tc] == "NA"):
-            if pd_spk[ID2][tc] == 'NA' or float(pd_spk[ID2][tc]) < 0.5:
-              pd_spk[ID2][tc] = "0.5"
+  return F
 
-      #else:  
-          #print >> sys.stderr, "%s and %s are not first degree relatives based on kinship, leaving proxy-case assignment as is from self report\n" % (ID1,ID2)
+#Refine proxy case assignment by self report by considering kinship matrix (e.g. if a proxy-case's affected relative is a case in the study the proxy-case will become NA)
+def proxy_via_selfreport_minus_kinship(F, kg):
+  # reassign to NA if proxy-case or control has case in cohort
+  caseRelative = kg.anyRelative(F == phenoStore.F_CASE, kinshipGraph.DEGREE_FIRST)
+  return proxyEngine.minus_kinship_F(F, caseRelative)
 
-  return pd_spk
+#Refine proxy case assignemnt by self report by considering kinship matrix (e.g. if a control does not report an affected first degree relative but we identify one in the study using kinship matrix, the control will become a proxy-case)
+def proxy_via_selfreport_plus_kinship(F, kg):
+  # reassign to 0.5 if control is 1dr to a case or NA from self report (consv control) is related to a case
+  caseRelative = kg.anyRelative(F == phenoStore.F_CASE, kinshipGraph.DEGREE_FIRST)
+  return proxyEngine.plus_kinship_F(F, caseRelative)
 
 #print output formatted for BOLT-LMM, requires first 10 columns of phenoFile are "FID", "IID", "PATID", "MATID", "Sex", "BirthYear", "batch", "PC1", "PC2", "PC3", "PC4" and last column is F which holds proxy-case assignment
-def BOLT_print(pd, tc):
-  # assumes BOLT-LMM sees -9 and -NA as missing data in --phenoFile (--phenoCol will be F)
-  header = ["FID", "IID", "PATID", "MATID", "Sex", "BirthYear", "batch", "PC1", "PC2", "PC3", "PC4", "F"]  # list of header strings
-  print "\t".join(header)  # print header
-  for sample in pd:
-    data = []
-    for x in pd[sample][0:11]: #assumes first 10 columns are as seen in header
-      data.append(x)
-    data.append(pd[sample][tc]) #F column which holds proxy case assignment
-    print "\t".join(str(x) for x in data)
-
-#if -n is provided an output file name, count the number of cases and proxy-cases a given sample is related to within the study
-def count_relatives(file,kd,pd,tc):
-
-  f1 = open(file, 'w+')
-
-  for sample in pd: #for every sample in phenotype file
-
-    list=search_nested_dict(kd,sample) #find all relatives
-
-    #initialize counts
-    proxy_case_count=0
-    case_count=0
-    relative_count=len(list)
-
-    #identify if relative is proxy case or case
-    for relative in list:
-      if relative in pd.keys(): #if relative is in phenotype file
-        if pd[relative][tc]=="0.5":
-          proxy_case_count+=1
-        elif pd[relative][tc]=="1":
-          case_count+=1
-
-    data_to_print=[sample,proxy_case_count,case_count,relative_count]
-    print >> f1, "\t".join(str(x) for x in data_to_print)
-
-  f1.close()
-
-def search_nested_dict(dict,key):
-  found=[]
-  for masterKey,masterValue in dict.iteritems():
-    if key in masterKey:
-      for ID, v in masterValue.items():
-        found.append(ID)
-    for childKey,childValue in masterValue.iteritems():
-      if key in childKey:
-          found.append(masterKey)
-  return found
-
-
-#print model 1 (standard gwas) phenotype file based on --pheno but consistent with proxyModel.py output
-def model1_print(header,cp,pd,name):
-  #delete output file if it exists because we are appending
-  try:
-    os.remove(name)
-  except OSError:
-    pass
-  f1 = open(name, 'a')
+def BOLT_print(ps, Fs, labels=("F",), out=sys.stdout, header=True):
+  # assumes BOLT-LMM sees -9 and -NA as missing data in --phenoFile (--phenoCol will be F, or one of labels if several F vectors are given)
+  if header:
+    print >> out, "\t".join(["FID", "IID", "PATID", "MATID", "Sex", "BirthYear", "batch", "PC1", "PC2", "PC3", "PC4"] + list(labels))  # print header
+  for line, f in zip(ps.lines, zip(*[phenoStore.f_strings(F) for F in Fs])):
+    data = line.split("\t", 11)[0:11] #assumes first 10 columns are as seen in header
+    data.extend(f) #F columns which hold proxy case assignment
+    print >> out, "\t".join(data)
+
+#print proxy-case assignment in the format chosen by -o, -x A prints sample ID and one column per F vector (with a header only when labels name traits)
+#first is False for the later blocks of a streamed phenotype file, which are printed without header
+def print_results(ps, Fs, labels, proxy, output, out=sys.stdout, header=False, first=True):
+  if output == "B":
+    BOLT_print(ps, Fs, labels, out, first)
+  elif output == "P" or (output == "S" and proxy == "SPK"):
+    if first:
+      print >> sys.stderr, "This functionality not available yet\n"
+  elif proxy == "A":
+    if header and first:
+      print >> out, "\t".join(["IID"] + list(labels))
+    for row in zip(ps.ids, *[phenoStore.f_strings(F) for F in Fs]):
+      print >> out, "\t".join(row)
+  else:
+    phenoStore.print_Fs(ps, Fs, labels, out, first)
+
+#model 1 F codes of a phenotype column, 1 stays 1 (case), 0 stays 0 (control), and anything else is NA (missing/unknown/NA)
+def model1_F(status):
+  return np.where(status == phenoStore.STATUS_CASE, phenoStore.F_CASE, np.where(status == phenoStore.STATUS_CONTROL, phenoStore.F_CONTROL, phenoStore.F_NA))
+
+#print model 1 (standard gwas) phenotype file based on --pheno but consistent with proxyModel.py output, every phenotype column in cps is relabelled,
+#Parquet or Arrow when name ends in .parquet or .arrow with the phenotype columns as numeric F values
+def model1_print(ps,cps,name,labels=("F",),threads=1):
+  if arrowIO.outputFormat(name):
+    names, columns = phenoStore.pheno_table(ps, dict((cp, (label, model1_F(ps.columns[cp]))) for cp, label in zip(cps, labels)))
+    arrowIO.writeTable(name, names, columns)
+    return
+  f1 = compressedIO.openOutput(name, threads)
+  model1_write(f1, ps, cps, labels)
+  f1.close() #close file
+  return
 
-  header_list=header.split("\t")
-  header_list[cp]="F" #replace header label with F
+#write model 1 lines of ps to the open file f1, header is False for the later blocks of a streamed phenotype file
+def model1_write(f1, ps, cps, labels=("F",), header=True):
+  header_list=ps.header.split("\t")
+  for cp,label in zip(cps,labels):
+    header_list[cp]=label #replace header label with F
 
-  print >> f1, "\t".join(header_list)
+  if header:
+    print >> f1, "\t".join(header_list)
 
   #expects phenotype column to have 1 for case, 0 for control, NA for missing so print as is
-  for sample in pd:
-    print >> f1, "\t".join(pd[sample])
-
-  f1.close() #close file
-  return
+  for line in ps.lines:
+    print >> f1, line
 
 #########################
 ########## MAIN #########
@@ -309,148 +202,97 @@ def main():
   except NameError:
     args.number = None
 
-  #always read phenotype file
-  phenoDict, totalCol, header = readPheno(args.pheno)  # read self report file
-
-  print >> sys.stderr, "Finished reading phenotype file %s at %s\n" % (args.pheno, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
-  
-  if (args.number is not None) or args.proxy=="SMK" or args.proxy=="SPK" or args.proxy=="A" or args.proxy=="K": #only read kinship file into memory if you have to
-    kinDict = readKinship(args.kinship,args.columnKin)  # read kinship file
-    print >> sys.stderr, "Finished reading kinship file %s\n" %args.kinship
-
-  # print kinDict
-  # print phenoDict
-
-  cp=args.columnPhenotype
-  cm=args.columnMother
-  cf=args.columnFather
-  cs=args.columnSibling
-
-  # create model 1 (standard gwas) phenotype file
-  model1_print(header,cp,phenoDict,args.model1)
-  print >> sys.stderr, "Finished printing model 1 (e.g. standard GWAS) phenotype file %s at %s. For more models please use proxyModel.py\n" % (args.model1, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+  if args.proxy not in PROXY_LABELS:
+    print >> sys.stderr, "Option for kinship designation not correct. Please use iether SMK, SR, SPK, K, or A.\n"
+    return
 
-  ########### Self report minus kinship ################
-  if args.proxy == "SMK":  # self report minus kinship
-    print >> sys.stderr, "Assigning proxy-cases based on self report (-x SMK) at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+  try:
+    traits = phenoStore.trait_columns(args.columnPhenotype,args.columnMother,args.columnFather,args.columnSibling)  # (cp, cm, cf, cs) for every trait
+  except ValueError as e:
+    print >> sys.stderr, "%s. Please give one --columnMother, --columnFather and --columnSibling per --columnPhenotype.\n" % e
+    sys.exit(1)
+  cps = [x[0] for x in traits]
+
+  if args.output is not None and any(arrowIO.outputFormat(x) for x in (args.outputFile or "", args.outputTrait or "")):
+    print >> sys.stderr, "Parquet and Arrow output is only available for the default output format, not with -o %s.\n" % args.output
+    sys.exit(1)
+
+  if args.stream:
+    if args.proxy != "SR" or args.number is not None or args.family is not None or args.familySummary is not None:
+      print >> sys.stderr, "--stream is only available with -x SR and without --number, --family and --familySummary, the kinship based logic needs every sample at once.\n"
+      sys.exit(1)
+    if any(arrowIO.outputFormat(x) for x in (args.model1, args.outputFile or "", args.outputTrait or "")):
+      print >> sys.stderr, "--stream writes text, Parquet and Arrow output needs every sample at once.\n"
+      sys.exit(1)
+    proxyEngine.stream_selfreport(args, traits, pheno_codes(traits), proxy_via_selfreport, model1_write, print_results)
+    print >> sys.stderr, "Finished streaming proxy-case assignment of %s at %s\n" % (args.pheno, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    return
 
-    phenoDict_SR = proxy_via_selfreport(phenoDict, args.conservControl, cp, cm, cf, cs)  # self report
-    print >> sys.stderr, "Finished assigning proxy-cases based on self report at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_SRMK = proxy_via_selfreport_minus_kinship(phenoDict_SR, kinDict, totalCol)  # self report minus kinship
-    print >> sys.stderr, "Finished refining proxy-case assignment based on kinship at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+  #always read phenotype file
+  phenoData = readPheno(args.pheno,traits,args.threads)  # read self report file
 
-    if args.number is not None:
-      count_relatives(args.number,kinDict,phenoDict_SRMK,totalCol)
-      print >> sys.stderr, "Finished counting relatives of each sample who are proxy-cases or cases at %s \n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+  print >> sys.stderr, "Finished reading phenotype file %s at %s\n" % (args.pheno, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+  names = phenoStore.trait_names(phenoData,cps)
+  wide = len(traits) > 1 and args.outputTrait is None  # one output with columns for every trait, otherwise one output per trait
 
-    if args.output == "B":
-      BOLT_print(phenoDict_SRMK,totalCol)
-    elif args.output == "P":
-      print >> sys.stderr, "This functionality not available yet\n"
-    else:
-      header_list=header.split("\t")
-      header_list.append("F") #add new column label to header
-      print "\t".join(header_list)
-      for sample in phenoDict_SRMK:
-        print "\t".join(phenoDict_SRMK[sample])
-    print >> sys.stderr, "Finished printing results at %s \n" %datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-  ############ self report only #####################
-  elif args.proxy == "SR":  # self report only
-    print >> sys.stderr, "Assigning proxy-cases based on self report (-x SR) at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    phenoDict_SR = proxy_via_selfreport(phenoDict, args.conservControl, cp, cm, cf, cs)  # self report
-    print >> sys.stderr, "Finished assigning proxy-cases based on self report at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    if args.output == "B":
-      BOLT_print(phenoDict_SRl,totalCol)
-    elif args.output == "P":
-      print >> sys.stderr, "This functionality not available yet\n"
-    else:
-      header_list=header.split("\t")
-      header_list.append("F") #add new column label to header
-      print "\t".join(header_list)
-      for sample in phenoDict_SR:
-        print "\t".join(phenoDict_SR[sample])
-    print >> sys.stderr, "Finished printing results at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    if args.number is not None:
-      count_relatives(args.number,kinDict,phenoDict_SR, totalCol)
-      print >> sys.stderr, "Finished counting relatives of each sample who are proxy-cases or cases at %s \n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-  ############# self report plus kinship ##############
-  elif args.proxy == "SPK":  # self report plus kinship
-    print >> sys.stderr, "Assigning proxy-cases based on self report plus kinship (-x SPK) at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_SR = proxy_via_selfreport(phenoDict, args.conservControl, cp, cm, cf, cs)  # self report
-    print >> sys.stderr, "Finished assigning proxy-cases based on self report at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_SRPK = proxy_via_selfreport_plus_kinship(phenoDict_SR, kinDict, totalCol)  # self report plus kinships
-    print >> sys.stderr, "Finished refining proxy-case assignment based on kinship at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    if args.output == "B":
-      BOLT_print(phenoDict_SRPK, totalCol)
-    elif args.output == "P" or args.output == "S":
-      print >> sys.stderr, "This functionality not available yet\n"
-    else:
-      header_list=header.split("\t")
-      header_list.append("F") #add new column label to header
-      print "\t".join(header_list)
-      for sample in phenoDict_SRPK:
-        print "\t".join(phenoDict_SRPK[sample])
-    print >> sys.stderr, "Finished printing results at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+  kinGraph = None
+  if (args.number is not None) or (args.family is not None) or (args.familySummary is not None) or args.proxy=="SMK" or args.proxy=="SPK" or args.proxy=="A" or args.proxy=="K": #only read kinship file into memory if you have to
+    degrees = (kinshipGraph.DEGREE_FIRST,) if args.number is None else range(kinshipGraph.DEGREE_UNRELATED) #relative counts also report duplicate, 2nd and 3rd degree relatives
+    kinGraph = kinshipGraph.loadKinship(args.kinship,args.columnKin,phenoData.ids,degrees,args.threads,args.kinCache)  # read relatives among phenotyped samples into kinship graph
+    print >> sys.stderr, "Finished reading kinship file %s\n" %args.kinship
 
-    if args.number is not None:
-      count_relatives(args.number, kinDict, phenoDict_SRPK, totalCol)
-      print >> sys.stderr, "Finished counting relatives of each sample who are proxy-cases or cases at %s \n"% datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                  
-
-    ############### kinship only ####################
-  elif args.proxy == "K":  # kinship only
-    print >> sys.stderr, "Assigning proxy-cases based on kinship (-x K) at %s" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    phenoDict_K = proxy_via_kinship(phenoDict, kinDict, args.conservControl, totalCol, cp)
-    print >> sys.stderr, "Finished assigning proxy-case based on kinship at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    if args.output == "B":
-      BOLT_print(phenoDict_K,totalCol)
-    elif args.output == "P":
-      print >> sys.stderr, "This functionality not available yet\n"
-    else:
-      header_list=header.split("\t")
-      header_list.append("F") #add new column label to header
-      print "\t".join(header_list)
-      for sample in phenoDict_K:
-        print "\t".join(phenoDict_K[sample])
+  family = None
+  if args.family is not None or args.familySummary is not None:
+    family = kinGraph.components()  # connected components of first degree relatives, every proxy-case rule stays within one
+    print >> sys.stderr, "Found %d families of first degree relatives among %d samples\n" % (int(family.max()) + 1 if len(family) else 0, len(family))
+    if args.family is not None:
+      proxyEngine.family_print(args.family, phenoData, family, args.threads)
+      print >> sys.stderr, "Finished printing family of each sample to %s\n" % args.family
+
+  # create model 1 (standard gwas) phenotype file, kinship graph is built once and shared by every trait
+  if wide:
+    model1_print(phenoData,cps,args.model1,["F_" + x for x in names],threads=args.threads)
+    print >> sys.stderr, "Finished printing model 1 (e.g. standard GWAS) phenotype file %s at %s. For more models please use proxyModel.py\n" % (args.model1, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+  allFs = []
+  allLabels = []
+  print >> sys.stderr, "Assigning proxy-cases for %d trait(s) (-x %s) at %s\n" % (len(traits), args.proxy, datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+  FsAll = proxyEngine.assign_traits(phenoData, kinGraph, args.proxy, args.conservControl, traits, proxy_via_selfreport, args.threads)
+  print >> sys.stderr, "Finished assigning proxy-cases at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+  for t, (trait, name) in enumerate(zip(traits, names)):
+    suffix = "" if len(traits) == 1 and args.outputTrait is None else "." + name  # file name suffix when printing one output per trait
+    if not wide:
+      model1_print(phenoData,[trait[0]],compressedIO.insertSuffix(args.model1, suffix),threads=args.threads)
+      print >> sys.stderr, "Finished printing model 1 (e.g. standard GWAS) phenotype file %s at %s. For more models please use proxyModel.py\n" % (compressedIO.insertSuffix(args.model1, suffix), datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+    Fs = [F[:, t] for F in FsAll]
+
+    labels = ["_".join([x for x in (logic, name if wide else "") if x]) for logic in PROXY_LABELS[args.proxy]]  # e.g. SR, SR_trait or trait
+    if wide:
+      allFs += Fs
+      allLabels += labels
+      continue
+
+    phenoStore.write_results(phenoData,Fs,["F_" + x if x else "F" for x in labels],args.proxy,args.output,print_results,args.outputFile if not suffix else compressedIO.insertSuffix(args.outputTrait, suffix),args.threads)
     print >> sys.stderr, "Finished printing results at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
     if args.number is not None:
-      count_relatives(args.number,kinDict,phenoDict_K,totalCol)
+      proxyEngine.count_relatives(compressedIO.insertSuffix(args.number, suffix),kinGraph,phenoData,Fs,labels,args.threads)
       print >> sys.stderr, "Finished counting relatives of each sample who are proxy-cases or cases at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-  ################# all proxy case designation options calculated #####################
-
-  elif args.proxy == "A":  # all
-    print >> sys.stderr, "Assigning proxy-cases based on four types of logic (-x A) at %s" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_SR = proxy_via_selfreport(phenoDict, args.conservControl, cp, cm, cf, cs)  # self report
-    print >> sys.stderr, "Finished assigning proxy-cases based on self report at %s \n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_SRMK = proxy_via_selfreport_minus_kinship(phenoDict_SR, kinDict, totalCol)  # self report minus kinship
-    print >> sys.stderr, "Finished refining proxy-case assignment based on kinship at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_SRPK = proxy_via_selfreport_plus_kinship(phenoDict_SR, kinDict, totalCol)  # self report plus kinships
-    print >> sys.stderr, "Finished refining proxy-case assignment based on kinship at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    phenoDict_K = proxy_via_kinship(phenoDict, kinDict, args.conservControl, totalCol, cp) #self report using only kinship
-    print >> sys.stderr, "Finished assigning proxy-cases based on kinship at %s\n" %datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if args.familySummary is not None:
+      proxyEngine.family_summary(compressedIO.insertSuffix(args.familySummary, suffix),family,Fs,labels,args.threads)
+      print >> sys.stderr, "Finished printing family summary at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
+  if wide:
+    phenoStore.write_results(phenoData,allFs,["F_" + x for x in allLabels],args.proxy,args.output,print_results,args.outputFile,args.threads,header=True)
+    print >> sys.stderr, "Finished printing results at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     if args.number is not None:
-      print >> sys.stderr, "This functionality is not available when -x A is invoked\n"
-
-    if args.output == "B" or args.output == "P":
-      print >> sys.stderr, "This functionality not possible when -x A is invoked\n"
-    else:
-      for sample in phenoDict:
-        print "\t".join([sample, phenoDict_SR[sample][totalCol], phenoDict_SRMK[sample][totalCol], phenoDict_SRPK[sample][totalCol], phenoDict_K[sample][totalCol]])
-    print >> sys.stderr, "Finished printing results at %s\n" %datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
- 
-  else:
-    print >> sys.stderr, "Option for kinship designation not correct. Please use iether SMK, SR, SPK, K, or A.\n"
+      proxyEngine.count_relatives(args.number,kinGraph,phenoData,allFs,allLabels,args.threads)
+      print >> sys.stderr, "Finished counting relatives of each sample who are proxy-cases or cases at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if args.familySummary is not None:
+      proxyEngine.family_summary(args.familySummary,family,allFs,allLabels,args.threads)
+      print >> sys.stderr, "Finished printing family summary at %s\n" % datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
 
 # call main
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+#===============================================================================
+# Copyright (c) 2019 Brooke Wolford
+# Lab of Dr. Cristen Willer and Dr. Mike Boehnke
+# University of Michigan
+
+#Permission is hereby granted, free of charge, to any person obtaining a copy
+#of this software and associated documentation files (the "Software"), to deal
+#in the Software without restriction, including without limitation the rights
+#to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+#copies of the Software, and to permit persons to whom the Software is
+#furnished to do so, subject to the following conditions:
+
+#The above copyright notice and this permission notice shall be included in all
+#copies or substantial portions of the Software.
+
+#THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+#IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+#FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+#AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+#LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+#OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+#SOFTWARE.
+#==============================================================================
+
+# Python 2.7.6
+# Proxy-case assignment rules shared by proxyCaseAssign1dr.py and proxyCaseAssignAffRel.py.
+# Every kinship based rule (SMK, SPK, K) only needs to know, per sample, whether any first degree
+# relative in the cohort is a case, so the first degree edges are walked once and the flag is reused.
+# The rules work on F vectors of one trait or on samples x traits F matrices, where the case relative flag
+# for every trait comes from one sparse product of the first degree adjacency matrix with the case indicators.
+# Families (connected components of first degree relatives) never share a relative, so they may be assigned in parallel.
+############################
+##### IMPORT MODULES #######
+###########################
+import os, shutil, sys, tempfile
+from multiprocessing import Pool
+import numpy as np
+import compressedIO
+import kinshipGraph
+import phenoStore
+from phenoStore import STATUS_CASE, STATUS_CONTROL, F_NA, F_CONTROL, F_PROXY2, F_PROXY, F_CASE
+
+############################
+######### FUNCTIONS ########
+############################
+
+TRAIT_BLOCK = 128 #traits per sparse product, bounds the int32 count matrix to samples x TRAIT_BLOCK
+SHARDS_PER_PROCESS = 4 #shards of whole families per worker process, so one large family does not hold up the others
+SHARED_DIR = "/dev/shm" #memory backed directory for the arrays shared with worker processes, the temporary directory if missing
+SHARED_ARRAYS = ["indptr", "indices", "kinship", "degree", "status"]
+FAMILY_CLASSES = ["cases", "proxyCases", "controls", "missing"] #columns of the family summary for each F vector
+FAMILY_CLASS = np.zeros(F_CASE + 2, dtype=np.int64) #F code+1 to position in FAMILY_CLASSES, F 0.5 and 0.25 are both proxy-cases
+FAMILY_CLASS[[F_CASE + 1, F_PROXY + 1, F_PROXY2 + 1, F_CONTROL + 1, F_NA + 1]] = [0, 1, 1, 2, 3]
+
+#True for samples with at least one first degree relative in the cohort who is a case, one traversal of the edges
+#status may be a samples x traits matrix, then the result is a boolean matrix of the same shape
+def case_relatives(kg, status):
+  if status.ndim == 1:
+    return kg.anyRelative(status == STATUS_CASE, kinshipGraph.DEGREE_FIRST)
+  found = np.zeros(status.shape, dtype=bool)
+  for start in range(0, status.shape[1], TRAIT_BLOCK):
+    found[:, start:start + TRAIT_BLOCK] = kg.relativeCounts(status[:, start:start + TRAIT_BLOCK] == STATUS_CASE, kinshipGraph.DEGREE_FIRST) > 0
+  return found
+
+#kinship only: cases are 1, controls are 0 unless a first degree relative is a case (0.5), anything else is NA
+def kinship_F(status, caseRelative):
+  F = np.full(status.shape, F_NA, dtype=np.int8)
+  F[status == STATUS_CASE] = F_CASE
+  control = status == STATUS_CONTROL
+  F[control] = F_CONTROL
+  F[control & caseRelative] = F_PROXY
+  return F
+
+#self report minus kinship: proxy-cases and controls with a case as first degree relative in the cohort become NA
+def minus_kinship_F(F, caseRelative):
+  F_smk = F.copy()
+  F_smk[caseRelative & ((F == F_PROXY) | (F == F_CONTROL))] = F_NA
+  return F_smk
+
+#self report plus kinship: controls and NA with a case as first degree relative in the cohort become proxy-cases
+def plus_kinship_F(F, caseRelative):
+  F_spk = F.copy()
+  F_spk[caseRelative & ((F == F_CONTROL) | (F == F_NA))] = F_PROXY
+  return F_spk
+
+#proxy-case assignment for the logic chosen by -x from self report F (not needed for K) and case/control status,
+#returns the list of F vectors or matrices (SR, SMK, SPK and K for A)
+#self report assigns F=1 exactly to samples with case status, so one case relative flag from one traversal of the first degree edges serves every rule
+def assign_proxy(proxy, F_SR, status, kg):
+  if proxy == "SR":
+    return [F_SR]
+  caseRelative = case_relatives(kg, status)
+  if proxy == "SMK":
+    return [minus_kinship_F(F_SR, caseRelative)]
+  elif proxy == "SPK":
+    return [plus_kinship_F(F_SR, caseRelative)]
+  elif proxy == "K":
+    return [kinship_F(status, caseRelative)]
+  return [F_SR, minus_kinship_F(F_SR, caseRelative), plus_kinship_F(F_SR, caseRelative), kinship_F(status, caseRelative)]
+
+PROXY_OUTPUTS = {"SMK": ["SMK"], "SPK": ["SPK"], "K": ["K"], "A": ["SR", "SMK", "SPK", "K"]} #F matrices returned by assign_proxy
+
+#arrays shared by all shards, set once per worker process from memory-mapped .npy files so nothing is pickled per shard
+_shardSettings = {}
+
+def initShardWorker(directory, proxy):
+  arrays = dict((name, np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")) for name in SHARED_ARRAYS + ["F_SR"] if os.path.exists(os.path.join(directory, name + ".npy")))
+  n = len(arrays["indptr"]) - 1
+  outputs = [np.load(os.path.join(directory, "assigned_" + x + ".npy"), mmap_mode="r+") for x in PROXY_OUTPUTS[proxy]]
+  _shardSettings.update(proxy=proxy, kg=kinshipGraph.KinshipGraph(range(n), arrays["indptr"], arrays["indices"], arrays["kinship"], arrays["degree"]), status=arrays["status"], F_SR=arrays.get("F_SR"), outputs=outputs)
+
+#assign proxy-cases for the samples in rows (sorted sample indices of whole families) in a worker process, F is written into the shared output arrays
+def assignShard(rows):
+  settings = _shardSettings
+  F_SR = None if settings["F_SR"] is None else np.asarray(settings["F_SR"][rows])
+  for out, F in zip(settings["outputs"], assign_proxy(settings["proxy"], F_SR, np.asarray(settings["status"][rows]), settings["kg"].subgraph(rows))):
+    out[rows] = F
+    out.flush()
+  return len(rows)
+
+#assign_proxy with the samples split into shards of whole families (see kinshipGraph.familyShards) assigned by a pool of processes
+#every rule only looks at first degree relatives, who are in the same family, so the merged F vectors are the same as those of assign_proxy
+#the first degree CSR arrays, case/control status and self report F are written once as .npy files that workers memory-map,
+#and workers write F of their shard into memory-mapped output arrays, so neither inputs nor results are pickled
+def assign_parallel(proxy, F_SR, status, kg, processes=1):
+  if proxy == "SR" or processes < 2 or len(status) == 0:
+    return assign_proxy(proxy, F_SR, status, kg)
+  shards = [x for x in kinshipGraph.familyShards(kg.components(), processes * SHARDS_PER_PROCESS) if len(x)]
+  first = kg.degree == kinshipGraph.DEGREE_FIRST
+  indptr, indices = kg.csr(kinshipGraph.DEGREE_FIRST)
+  arrays = {"indptr": indptr, "indices": indices, "kinship": kg.kinship[first], "degree": kg.degree[first], "status": status}
+  if F_SR is not None:
+    arrays["F_SR"] = F_SR
+  base = tempfile.mkdtemp(dir=SHARED_DIR if os.path.isdir(SHARED_DIR) else None)
+  try:
+    directory = os.path.join(base, "arrays")
+    kinshipGraph.saveArrays(directory, arrays, {"proxy": proxy})
+    for x in PROXY_OUTPUTS[proxy]:
+      np.lib.format.open_memmap(os.path.join(directory, "assigned_" + x + ".npy"), mode="w+", dtype=np.int8, shape=status.shape).flush()
+    pool = Pool(processes, initShardWorker, (directory, proxy))
+    try:
+      pool.map(assignShard, shards)
+      pool.close()
+      pool.join()
+    finally:
+      pool.terminate()
+    Fs = [np.load(os.path.join(directory, "assigned_" + x + ".npy")) for x in PROXY_OUTPUTS[proxy]]
+  finally:
+    shutil.rmtree(base)
+  return Fs
+
+#assign proxy-cases for every trait at once with the logic chosen by -x, selfreport is the proxy_via_selfreport function of the calling script
+#(called with ps, cc and the columns of one trait), returns one samples x traits F matrix per logic (SR, SMK, SPK and K for -x A)
+#the kinship based logic needs one sparse product of the first degree adjacency matrix with the case indicators of all traits
+#with threads > 1 the kinship based logic is run by a pool of processes on shards of whole families, giving the same F values
+def assign_traits(ps, kg, proxy, cc, traits, selfreport, threads=1):
+  status = np.column_stack([ps.columns[t[0]] for t in traits])
+  F_SR = None
+  if proxy == "K":
+    if cc:
+      print >> sys.stderr, 'Conservative control functionality is not available with kinship only option\n'
+  else:
+    F_SR = np.column_stack([selfreport(ps, cc, *t) for t in traits])  # self report
+  return assign_parallel(proxy, F_SR, status, kg, threads)
+
+#with --stream, assign proxy-cases by self report one block of phenotype lines at a time (-p - reads standard input)
+#model 1 and results of each block are written before the next block is read, in the same files and layout as without --stream
+#codes are the value codes of the trait columns, selfreport, model1_write and print_results are the functions of the calling script
+def stream_selfreport(args, traits, codes, selfreport, model1_write, print_results):
+  cps = [x[0] for x in traits]
+  sinks = None
+  for block in phenoStore.streamPheno(args.pheno, codes, threads=args.threads):
+    first = sinks is None
+    if first:  # trait names come from the header, so output files are opened with the first block
+      names = phenoStore.trait_names(block, cps)
+      if len(traits) > 1 and args.outputTrait is None:
+        sinks = [(compressedIO.openOutput(args.model1, args.threads), sys.stdout if args.outputFile is None else compressedIO.openOutput(args.outputFile, args.threads), range(len(traits)), ["F_" + x for x in names], ["F_" + x for x in names])]
+      else:
+        suffixes = [""] if len(traits) == 1 and args.outputTrait is None else ["." + x for x in names]
+        sinks = [(compressedIO.openOutput(compressedIO.insertSuffix(args.model1, s), args.threads), (sys.stdout if args.outputFile is None else compressedIO.openOutput(args.outputFile, args.threads)) if not s else compressedIO.openOutput(compressedIO.insertSuffix(args.outputTrait, s), args.threads), [t], ["F"], ["F"]) for t, s in enumerate(suffixes)]
+    F = assign_traits(block, None, "SR", args.conservControl, traits, selfreport)[0]
+    for f1, out, idx, modelLabels, labels in sinks:
+      model1_write(f1, block, [cps[t] for t in idx], modelLabels, first)
+      print_results(block, [F[:, t] for t in idx], labels, "SR", args.output, out, header=len(idx) > 1, first=first)
+  for f1, out, idx, modelLabels, labels in sinks:
+    f1.close()
+    if out is not sys.stdout:
+      out.close()
+
+#size of every family (see KinshipGraph.components) and, for each F vector, a families x FAMILY_CLASSES matrix of the number of cases, proxy-cases, controls and NA
+#every rule above only looks at first degree relatives, so the F values of a family depend on that family alone
+def family_counts(family, Fs):
+  nfam = int(family.max()) + 1 if len(family) else 0
+  width = len(FAMILY_CLASSES)
+  sizes = np.bincount(family, minlength=nfam)
+  counts = [np.bincount(family.astype(np.int64) * width + FAMILY_CLASS[F.astype(np.int16) + 1], minlength=nfam * width).reshape(nfam, width) for F in Fs]
+  return sizes, counts
+
+#print the family of every sample (connected component of first degree relatives in the cohort,
+#numbered from 1 in order of the phenotype file) and the number of samples in that family
+def family_print(file, ps, family, threads=1):
+  sizes = np.bincount(family)
+  phenoStore.write_counts(file, ["IID", "family", "familySize"], ps.ids, [family + 1, sizes[family]], threads)
+
+#print the size of every family and its number of cases, proxy-cases (F 0.5 or 0.25), controls and NA for each F vector
+def family_summary(file, family, Fs, labels=("",), threads=1):
+  sizes, counts = family_counts(family, Fs)
+  header = ["family", "familySize"]
+  columns = [sizes]
+  for c, s in zip(counts, ["_" + x if x else "" for x in labels]):
+    header += [x + s for x in FAMILY_CLASSES]
+    columns += [c[:, k] for k in range(len(FAMILY_CLASSES))]
+  phenoStore.write_counts(file, header, [str(x) for x in range(1, len(sizes) + 1)], columns, threads)
+
+#count the relatives of every sample within the study in one pass over the kinship graph
+#columns are number of proxy-case and case first degree relatives (for each F vector with -x A), number of first degree relatives,
+#number of duplicate/MZ, 2nd and 3rd degree relatives, and number of first degree relatives in each F category (for each F vector)
+#the first columns count first degree relatives only, the per sample loop this replaced counted every kinship file pair of any kinship
+def count_relatives(file, kg, ps, Fs, labels=("",), threads=1):
+  suffix = ["_" + x if x else "" for x in labels]
+  header = ["IID"]
+  columns = []
+  byF = []
+  for F, s in zip(Fs, suffix):
+    counts = kg.categoryCounts(phenoStore.f_category(F), len(phenoStore.F_ORDER), kinshipGraph.DEGREE_FIRST)
+    byF.append(counts)
+    header += ["proxyCaseRelatives" + s, "caseRelatives" + s]
+    columns += [counts[:, phenoStore.F_ORDER.index(phenoStore.F_PROXY)], counts[:, phenoStore.F_ORDER.index(phenoStore.F_CASE)]]
+
+  degrees = kg.degreeCounts()
+  header += ["firstDegreeRelatives", "duplicateRelatives", "secondDegreeRelatives", "thirdDegreeRelatives"]
+  columns += [degrees[:, kinshipGraph.DEGREE_FIRST], degrees[:, kinshipGraph.DEGREE_DUPLICATE], degrees[:, kinshipGraph.DEGREE_SECOND], degrees[:, kinshipGraph.DEGREE_THIRD]]
+
+  for counts, s in zip(byF, suffix):
+    header += ["relativesF_" + phenoStore.F_STRINGS[x] + s for x in phenoStore.F_ORDER]
+    columns += [counts[:, k] for k in range(len(phenoStore.F_ORDER))]
+
+  phenoStore.write_counts(file, header, ps.ids, columns, threads)
@@ -35,6 +35,8 @@ import argparse
 from itertools import islice
 import gzip, re, os, math, sys
 import copy
+import compressedIO
+import phenoStore
 
 ###########################
 ##### PARSE ARGUMENTS ####
@@ -44,10 +46,12 @@ def get_settings():
   description='''Script to convert proxy-case assignment phenotype file to a phenotype file ready for analysis. Model definitions are 1=standard GWAS, 2=GWAS with proxy-cases removed from controls (i.e. cleaner controls), 3=GWAX with proxy-cases as cases, 4=Cases vs proxy-cases vs controls (i.e. appropriately modelling proxy-cases as intermediate), 5=Cases + proxy-cases vs controls. Identical to --pheno file except --column has been converted to values that correspond to the --model.'''
 )
   parser.add_argument("-k","--kinship",help="Kinship from KING2 and requires header", type=str,required=True)
-  parser.add_argument("-p","--pheno",help="Phenotype file of any format. For Models 2-5 the F column must be 0, 0.25, 0.5, 1 or NA.\nDefault expects format IID FID PATID MATID Sex BirthYear batch PC1 PC2 PC3 PC4 F. Requires header line. This file is read into memory.", type=str, required=True)
+  parser.add_argument("-p","--pheno",help="Phenotype file of any format, plain text or gzip, bgzip or zstd compressed. For Models 2-5 the F column must be 0, 0.25, 0.5, 1 or NA.\nDefault expects format IID FID PATID MATID Sex BirthYear batch PC1 PC2 PC3 PC4 F. Requires header line. This file is read one line at a time and lines are written in the same order.", type=str, required=True)
   parser.add_argument("-c","--column",help="0-based column number for F column with 0, 0.25, 0.5, 1 or NA [default=12]",type=int,default=11)
-  parser.add_argument("-o","--output",help="Full path for name and location of output file. Output file is ready for BOLT-LMM with --phenoCol=F.", type=str, required=True)
-  parser.add_argument("-m","--model",help="Type of model and way to consider proxy-cases\n[1=standard GWAS, 2=GWAS with cleaner controls, 3=GWAX, 4=Cases vs proxy-cases vs controls, 5=Cases + proxy-cases vs controls]\n", type=int, required=True)
+  parser.add_argument("-o","--output",help="Full path for name and location of output file. Output file is ready for BOLT-LMM with --phenoCol=F. With several models one file per model is written as <output>.m<model> unless --wide is used. Output named .gz or .bgz is bgzip compressed and .zst is zstd compressed (<output>.m<model> keeps the extension last)", type=str, required=True)
+  parser.add_argument("-m","--model",help="Type of model and way to consider proxy-cases, several models may be given as a list or range such as 2,3,4,5 or 2-5\n[1=standard GWAS, 2=GWAS with cleaner controls, 3=GWAX, 4=Cases vs proxy-cases vs controls, 5=Cases + proxy-cases vs controls]\n", type=phenoStore.parse_columns, required=True)
+  parser.add_argument("-w","--wide",help="With several models write one output file with the F column of every model added as F_m<model> columns [default=FALSE]",action="store_true")
+  parser.add_argument("-t","--threads",help="Number of threads decompressing the phenotype file and compressing output files [default=1]",type=int,default=1)
   parser.add_argument("-r","--remove2dr",help="Use flag to print second degree relatives (F=0.25) as NA thereby removing those samples from analysis [default=FALSE]",action="store_true",dest='remove')
   parser.set_defaults(remove=False)
   args=parser.parse_args()
@@ -57,76 +61,59 @@ def get_settings():
 ######### FUNCTIONS ########
 ############################
 
-#read in phenotype file
-def readPheno(file):
-  phenoDict={} #initialize
-  count=0
-  f=open(file,"r")
-  for line in f:
-    line = line.rstrip()
-    if count==0:
-      header=line #save header
-      count+=1
-    else:
-      line_list=line.split("\t")
-      phenoDict[line_list[0]]=line_list #ID is key and full line is value
-      count+=1
-  return phenoDict, header
-
+#F value (as string) to F value for each model, values not listed are unchanged
+MODEL_F={
+  2:{"0.25":"NA","0.5":"NA"}, #GWAS with cleaner controls, 1st and 2nd degree proxy-cases to NA
+  3:{"0.25":"NA","1":"NA","0.5":"1"}, #GWAX using proxy-cases as cases, 2nd degree proxy-cases and cases to NA
+  4:{"0.25":"NA"}, #model cases, proxy-cases, and controls separately as semi-continuous, 2nd degree proxy-cases to NA
+  5:{"0.25":"NA","0.5":"1"} #GWAS grouping proxy-cases and cases as cases, 2nd degree proxy-cases to NA
+}
 
 #creates phenotype file for BOLT-LMM that uses the proxy-cases as the specified model dictates
-def updateF(phenoDict,col,model,output,header):
-
-  #delete output file if it exists because we are appending
-  try:
-    os.remove(output)
-  except OSError:
-    pass
-  f1 = open(output, 'a')
-
-  print >> f1, header
-
-
-
-  for line in phenoDict.keys(): #loop through every line in phenotype file
-    
-    zc=col #0-based column for F
-    f=str(phenoDict[line][zc]) #save F value as string
-
+#the phenotype file is streamed one line at a time, so memory use does not grow with the file
+def updateF(file,col,model,output,threads=1):
+  updateF_models(file,col,[model],[output],threads=threads)
+
+#write the phenotype files of several models from one pass over the phenotype file, F is mapped through a lookup table per model
+#outputs is one file name per model, or one file name for all models with wide=True (F column of every model added as F_m<model>)
+#model 1 and unknown models are reported and left out, with no output file or column, and nothing is written if no model is left
+def updateF_models(file,col,models,outputs,wide=False,threads=1):
+  kept=[]
+  for k,model in enumerate(models):
     if model == 1: #standard GWAS
       print >> sys.stderr, "Model 1 is Standard GWAS and a phenotype file for this analysis is created by proxyCaseAssign1dr.py or proxyCaseAssignAffRel.py based on the phenotype files provided there.\n"
-      break
-
-    elif model == 2: #GWAS with cleaner controls
-      if f=="0.25":
-        phenoDict[line][zc]="NA" #convert 2nd degree proxy-case to NA
-      elif f=="0.5":
-        phenoDict[line][zc]="NA" #convert 1st degree proxy-case to NA
-
-    elif model == 3: #GWAX using proxy-cases as cases
-      if f=="0.25":
-        phenoDict[line][zc]="NA" #convert 2nd degree proxy-case to NA
-      elif f=="1": #convert cases to NA
-         phenoDict[line][zc]="NA" #convert cases to NA
-      elif f=="0.5":
-        phenoDict[line][zc]=1 #convert 1st degree proxy-case to case 
-
-    elif model == 4: #model cases, proxy-cases, and controls separately as semi-continuous
-      if f=="0.25":
-        phenoDict[line][zc]="NA" #convert 2nd degree proxy-case to NA
-
-    elif model == 5: #GWAS grouping proxy-cases and cases as cases 
-      if f=="0.25":
-        phenoDict[line][zc]="NA" #convert 2nd degree proxy-case to NA
-      elif f=="0.5":
-        phenoDict[line][zc]=1 #convert 1st degree proxy-case to case
-
+    elif model not in MODEL_F:
+      print >> sys.stderr, "Model variable is not expected. Please enter 1, 2, 3, 4 or 5.\n"
+    else:
+      kept.append(k)
+  if not kept:
+    return
+  models=[models[k] for k in kept]
+  tables=[MODEL_F[model] for model in models]
+
+  f=compressedIO.openInput(file,threads)
+  header=f.readline().rstrip()
+  if wide:
+    out=[compressedIO.openOutput(outputs[0],threads)]
+    out[0].write("\t".join([header]+["F_m%d" % model for model in models])+"\n")
+  else:
+    out=[compressedIO.openOutput(outputs[k],threads) for k in kept]
+    for f1 in out:
+      f1.write(header+"\n")
+
+  for line in f: #loop through every line in phenotype file
+    line_list=line.rstrip().split("\t")
+    value=line_list[col] #save F value as string
+    if wide:
+      out[0].write("\t".join(line_list+[table.get(value,value) for table in tables])+"\n")
     else:
-      print >> sys.stderr, "Model variable is not expected. Please enter 1, 2, 3 or 4.\n"
+      for f1,table in zip(out,tables):
+        line_list[col]=table.get(value,value)
+        f1.write("\t".join(line_list)+"\n") #print to output file
 
-    print >> f1, "\t".join(str(x) for x in phenoDict[line]) #print to output file
-  
-  f1.close() #close file  
+  f.close()
+  for f1 in out:
+    f1.close() #close file  
 
 def updateF_2dr(phenoDict,col,model,output,header):
   print >> sys.stderr, "Functionality not yet available.\n"
@@ -138,10 +125,13 @@ def updateF_2dr(phenoDict,col,model,output,header):
 def main():  
     args = get_settings()
 
-    phenoDict,header=readPheno(args.pheno) #read phenotype file with proxy-case definition
-    
     if args.remove:
-      updateF(phenoDict,args.column,args.model,args.output,header) #update F to match model
+      if len(args.model)==1:
+        updateF(args.pheno,args.column,args.model[0],args.output,args.threads) #update F to match model
+      else:
+        stem,ext=compressedIO.splitCompressed(args.output)
+        outputs=[args.output] if args.wide else ["%s.m%d%s" % (stem,model,ext) for model in args.model]
+        updateF_models(args.pheno,args.column,args.model,outputs,args.wide,args.threads) #update F of every model in one pass over the phenotype file
     elif args.remove == False: 
       #updateF_2dr(phenoDict,args.column,args.model,args.output,header) #update F to match model, keep second degree relatives
       print >> sys.stderr, "Functionality not yet available.\n"